@@ -1,34 +1,187 @@
-import random
+import argparse
 import time
+from typing import Any, Optional, Tuple, cast
 
+from PIL import Image
 from loguru import logger
 
-from . import spotify, twitter
+from .accounts import load_accounts
+from .api.retry import SpotifyUnavailableError
+from .bootstrap import Clients, configure_logging, create_clients
 from .config import Config
-from .image.generate import generate_image
-from .twitter import update_twitter_banner
-from .utils import get_song_info
+from .engine import BannerEngine, default_scheduler
+from .fingerprint import FingerprintStore, compute_fingerprint
+from .image.fonts import fonts
+from .image.generate import PROGRESS_BOX, banner_layout, encode_banner, renderer, visual_change
+from .metrics import BANNER_UPDATES_SKIPPED, CYCLE_SECONDS, start_metrics_logging, start_metrics_server
+from .profiling import profiler
+from .scheduler import Scheduler
+from .speculation import BannerSpeculator
+from .uploader import BannerUploader
+from .utils import get_song_info_concurrently, get_status
 
-while True:
-    # Get top tracks.
-    top_tracks = spotify.top_tracks(limit=5)
 
-    top_tracks = [track for track in top_tracks["items"]]
+def run_accounts() -> None:
+    """Update the banners of all the accounts in the accounts file."""
+    accounts = load_accounts(Config.ACCOUNTS_FILE)
+    logger.info(f"Updating the banners of {len(accounts)} accounts.")
 
-    # Get song info with switch to recently played if no song is playing.
-    song = get_song_info(spotify=spotify)
+    engine = BannerEngine(accounts)
 
-    # Get the status.
-    status = random.choice(Config.STATUS_MAPPING[song.is_now_playing]) + ":"
+    try:
+        engine.run()
+    finally:
+        engine.stop()
 
-    # Generate the spotify banner image.
-    generate_image(status, song, top_tracks, Config.IMAGE_PATH)
-    logger.info("Generated the image")
 
-    # Update the banner
-    update_twitter_banner(twitter)
-    logger.info("Updated twitter banner")
+def publish(uploader: BannerUploader, banner: bytes, fingerprint: str) -> None:
+    """Save the banner unless it's only kept in memory, and update it in the background."""
+    if not Config.IN_MEMORY_UPLOAD:
+        with open(Config.IMAGE_PATH, "wb") as file:
+            file.write(banner)
 
-    # Sleep for specified interval.
-    logger.info(f"Sleeping for {Config.UPDATE_INTERVAL} minutes.")
-    time.sleep(Config.UPDATE_INTERVAL * 60)
+    # Replacing any banner that isn't uploaded yet.
+    uploader.submit(banner, fingerprint)
+
+
+def close_frame(published: Optional[Tuple[Any, Image.Image]]) -> None:
+    """Close the copy of the last uploaded frame, once it's replaced."""
+    if published is not None:
+        published[1].close()
+
+
+def run_account(clients: Clients, scheduler: Optional[Scheduler] = None, cycles: Optional[int] = None) -> None:
+    """Update the banner of the account configured in the environment, forever or for the number of cycles."""
+    concurrent_spotify = clients.concurrent_spotify
+
+    # Wake up just after the songs end, and back off while nothing is playing.
+    scheduler = scheduler or default_scheduler()
+
+    # Fingerprint of the last published banner.
+    fingerprints = FingerprintStore(Config.FINGERPRINT_PATH)
+
+    # Upload the banners in the background, storing the fingerprint of the uploaded banner.
+    uploader = BannerUploader(
+        clients.twitter,
+        on_uploaded=lambda uploaded: fingerprints.save(cast(str, uploaded.fingerprint)),
+    ).start()
+
+    # Pre-render the banner of the next track in the queue.
+    speculator = BannerSpeculator(concurrent_spotify) if Config.SPECULATIVE_PRERENDER else None
+
+    # Last uploaded frame, with the key of its composite to detect progress only changes.
+    published: Optional[Tuple[Any, Image.Image]] = None
+
+    cycle = 0
+
+    while cycles is None or cycle < cycles:
+        cycle += 1
+        cycle_start = time.monotonic()
+        unavailable = False
+
+        # Profile the cycle, if it's sampled.
+        with profiler.cycle():
+            try:
+                # Get top tracks, in the background.
+                top_tracks_future = concurrent_spotify.top_tracks(limit=5)
+
+                # Get song info with switch to recently played if no song is playing.
+                song = get_song_info_concurrently(spotify=concurrent_spotify, history=clients.history)
+
+                top_tracks = [track for track in top_tracks_future.result()["items"]]
+            except SpotifyUnavailableError as error:
+                # Keep the current banner, and back off until spotify recovers.
+                delay = scheduler.next_delay(None, elapsed=time.monotonic() - cycle_start)
+                unavailable = True
+
+                logger.warning(f"{error} Keeping the current banner, Retrying in {delay:.0f} seconds.")
+            else:
+                # Get the status.
+                status = get_status(song)
+
+                # Skip rendering and uploading, if the banner would look the same as the published or queued one.
+                fingerprint = compute_fingerprint(status, song, top_tracks)
+
+                # Upload the pre-rendered banner right away, if the predicted track started.
+                speculative = speculator.take(song) if speculator is not None else None
+
+                if speculative is not None:
+                    logger.info("Next track started as predicted, Using the pre-rendered banner.")
+
+                    publish(uploader, speculative.banner, speculative.fingerprint)
+
+                    close_frame(published)
+                    published = None
+                elif fingerprints.matches(fingerprint) or uploader.pending_fingerprint == fingerprint:
+                    logger.info("Banner is unchanged, Skipping the update.")
+                    BANNER_UPDATES_SKIPPED.labels(reason="unchanged").inc()
+                else:
+                    # Generate the spotify banner image, redrawing only the progress if nothing else changed.
+                    frame = renderer.render_frame(status, song, top_tracks)
+
+                    # Skip uploading a progress only change, if too little of the banner changed to notice.
+                    progress_only = published is not None and published[0] == renderer.frame_key
+
+                    if progress_only and visual_change(published[1], frame, PROGRESS_BOX) < Config.MIN_VISUAL_CHANGE:
+                        logger.info("Banner barely changed, Skipping the update.")
+                        BANNER_UPDATES_SKIPPED.labels(reason="barely_changed").inc()
+                    else:
+                        banner = encode_banner(frame)
+                        logger.info(f"Generated the image ({banner.getbuffer().nbytes / 1024:.0f} KiB)")
+
+                        publish(uploader, banner.getvalue(), fingerprint)
+
+                        if Config.MIN_VISUAL_CHANGE:
+                            close_frame(published)
+                            published = (renderer.frame_key, frame.copy())
+
+                CYCLE_SECONDS.observe(time.monotonic() - cycle_start)
+
+                # Sleep until the next update is due.
+                delay = scheduler.next_delay(song, elapsed=time.monotonic() - cycle_start)
+
+        # Back off outside of the profiled cycle, so the wait is not profiled.
+        if unavailable:
+            time.sleep(delay)
+            continue
+
+        # Pre-render the next track while sleeping, if the song ends before the next update.
+        if speculator is not None:
+            speculator.speculate(song, top_tracks, delay)
+
+        logger.info(f"Sleeping for {delay:.0f} seconds.")
+        time.sleep(delay)
+
+    uploader.stop()
+    close_frame(published)
+
+
+# Guarded, as the render processes import the main module.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update the twitter banner with the spotify activity.")
+    parser.add_argument(
+        "--profile", type=int, default=Config.PROFILE_EVERY, metavar="N", help="Profile every Nth cycle to the profiles directory."
+    )
+
+    profiler.every = parser.parse_args().profile
+
+    configure_logging()
+
+    # Load the fonts used by the banner upfront.
+    for font_load in fonts.preload(banner_layout.fonts):
+        logger.debug(
+            f"Loaded font {font_load.path} ({font_load.size}px) in {font_load.load_time * 1000:.2f}ms, "
+            f"{font_load.file_size / 1024:.0f} KiB file, {font_load.memory / 1024:.0f} KiB resident."
+        )
+
+    # Expose the metrics, and log them periodically.
+    if Config.METRICS_PORT:
+        start_metrics_server(Config.METRICS_PORT, Config.METRICS_HOST)
+
+    if Config.METRICS_LOG_INTERVAL:
+        start_metrics_logging(Config.METRICS_LOG_INTERVAL)
+
+    if Config.ACCOUNTS_FILE:
+        run_accounts()
+    else:
+        run_account(create_clients())
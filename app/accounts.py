@@ -0,0 +1,41 @@
+import json
+from dataclasses import dataclass, fields
+from typing import List
+
+
+@dataclass
+class Account:
+    name: str
+
+    # Spotify credentials
+    spotify_client_id: str
+    spotify_client_secret: str
+    spotify_refresh_token: str
+
+    # Twitter credentials
+    twitter_consumer_key: str
+    twitter_consumer_secret: str
+    twitter_access_token: str
+    twitter_access_token_secret: str
+
+
+def load_accounts(path: str) -> List[Account]:
+    """Load the accounts from a JSON file, containing a list of objects with the fields of `Account`."""
+    with open(path) as file:
+        data = json.load(file)
+
+    names = {field.name for field in fields(Account)}
+    accounts = []
+
+    for i, account in enumerate(data):
+        missing = names - set(account)
+
+        if missing:
+            raise Exception(f"Account {account.get('name', i)} is missing: {', '.join(sorted(missing))}")
+
+        accounts.append(Account(**{name: str(account[name]) for name in names}))
+
+    if len({account.name for account in accounts}) != len(accounts):
+        raise Exception("Account names must be unique.")
+
+    return accounts
@@ -0,0 +1,170 @@
+import copy
+import json
+import os
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Optional, cast
+from urllib.parse import parse_qs, urlsplit
+
+from loguru import logger
+
+from .route import Route
+from ..metrics import SPOTIFY_CACHE_HITS, SPOTIFY_CACHE_MISSES
+
+# Query parameters of the cursors, a cursor is rarely requested again once newer items exist.
+CURSOR_PARAMS = ("after", "before")
+
+
+class ResponseCache:
+    """Cache of the responses of slow changing routes, each expiring after the TTL of the route.
+
+    Entries are keyed by the method and the full URL, and the TTLs are looked up by the path without the query.
+    Routes without a TTL, and pages of a cursor, are never cached. Expired responses are kept for `max_stale`
+    seconds more, to be served while spotify is unavailable, and evicted after.
+    """
+
+    def __init__(self, ttls: Dict[str, float], path: Optional[str] = None, max_stale: float = 0) -> None:
+        self.ttls = ttls
+        self.path = path
+        self.max_stale = max_stale
+
+        # Cached responses as `key -> (stored_at, expires_at, data)`.
+        self.entries: Dict[str, tuple] = {}
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+
+        self.hits: Counter = Counter()
+        self.misses: Counter = Counter()
+
+        if self.path:
+            self._load()
+
+    @staticmethod
+    def _key(route: Route) -> str:
+        return f"{route.method} {route.url}"
+
+    def ttl_for(self, route: Route) -> Optional[float]:
+        """Get the TTL of the route, if it is cacheable."""
+        if route.method != "GET":
+            return None
+
+        if any(param in CURSOR_PARAMS for param in parse_qs(urlsplit(route.path).query)):
+            return None
+
+        return self.ttls.get(route.endpoint)
+
+    def get(self, route: Route) -> Optional[Any]:
+        """Get a copy of the cached response for the route, if it hasn't expired."""
+        if self.ttl_for(route) is None:
+            return None
+
+        with self.lock:
+            entry = self.entries.get(self._key(route))
+
+            if entry is None or entry[1] <= time.time():
+                self.misses[route.endpoint] += 1
+                SPOTIFY_CACHE_MISSES.labels(route=route.endpoint).inc()
+                return None
+
+            self.hits[route.endpoint] += 1
+            SPOTIFY_CACHE_HITS.labels(route=route.endpoint).inc()
+            return copy.deepcopy(entry[2])
+
+    def get_stale(self, route: Route) -> Optional[Any]:
+        """Get a copy of the cached response for the route, even if it has expired less than `max_stale` ago."""
+        if self.ttl_for(route) is None:
+            return None
+
+        with self.lock:
+            entry = self.entries.get(self._key(route))
+
+            if entry is None or entry[1] + self.max_stale <= time.time():
+                return None
+
+            return copy.deepcopy(entry[2])
+
+    def set(self, route: Route, data: Any) -> None:
+        """Store the response for the route, if it is cacheable."""
+        ttl = self.ttl_for(route)
+
+        if ttl is None or data is None:
+            return
+
+        now = time.time()
+
+        with self.lock:
+            self._evict(now)
+            self.entries[self._key(route)] = (now, now + ttl, copy.deepcopy(data))
+
+        if self.path:
+            self._save()
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        """Drop the cached responses of the routes starting with the path, or every response."""
+        with self.lock:
+            if path is None:
+                self.entries.clear()
+            else:
+                for key in [key for key in self.entries if key.split(" ", 1)[1].startswith(Route("GET", path).url)]:
+                    del self.entries[key]
+
+        if self.path:
+            self._save()
+
+    @property
+    def hit_rate(self) -> float:
+        hits = sum(self.hits.values())
+        total = hits + sum(self.misses.values())
+
+        return hits / total if total else 0.0
+
+    @property
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Get the hits and misses of every route."""
+        return {
+            path: {"hits": self.hits[path], "misses": self.misses[path]}
+            for path in sorted(set(self.hits) | set(self.misses))
+        }
+
+    def _evict(self, now: float) -> None:
+        """Drop the responses which expired more than `max_stale` ago, and can't be served anymore."""
+        for key in [key for key, entry in self.entries.items() if entry[1] + self.max_stale <= now]:
+            del self.entries[key]
+
+    # Persistence
+    def _load(self) -> None:
+        try:
+            with open(cast(str, self.path)) as file:
+                entries = json.load(file)
+        except (OSError, ValueError):
+            return
+
+        self.entries = {key: tuple(entry) for key, entry in entries.items()}
+        self._evict(time.time())
+
+    def _save(self) -> None:
+        path = cast(str, self.path)
+        tmp_path = f"{path}.tmp"
+
+        with self.lock:
+            entries = dict(self.entries)
+
+        # Saves from concurrent requests share the temporary file, so they must not overlap.
+        with self.save_lock:
+            self._write(path, tmp_path, entries)
+
+    @staticmethod
+    def _write(path: str, tmp_path: str, entries: Dict[str, tuple]) -> None:
+        try:
+            directory = os.path.dirname(path)
+
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            with open(tmp_path, "w") as file:
+                json.dump(entries, file)
+
+            os.replace(tmp_path, path)
+        except OSError as error:
+            logger.warning(f"Failed to persist the response cache: {error}")
@@ -0,0 +1,32 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from .spotify import Spotify
+
+
+class ConcurrentSpotify:
+    """Thread pool backed Spotify client, where the endpoints return futures so the requests can overlap."""
+
+    def __init__(self, spotify: Spotify, max_workers: int = 4, executor: Optional[ThreadPoolExecutor] = None) -> None:
+        self.spotify = spotify
+        self.executor = executor or ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="spotify")
+
+    def submit(self, function: Callable[..., Any], *args, **kwargs) -> Future:
+        """Run the function on the pool, such as downloading the album art."""
+        return self.executor.submit(function, *args, **kwargs)
+
+    # Main endpoints
+    def currently_playing(self) -> "Future[Dict[str, Any]]":
+        return self.submit(self.spotify.currently_playing)
+
+    def queue(self) -> "Future[Dict[str, Any]]":
+        return self.submit(self.spotify.queue)
+
+    def recently_played(self, *args, **kwargs) -> "Future[Dict[str, Any]]":
+        return self.submit(self.spotify.recently_played, *args, **kwargs)
+
+    def top_tracks(self, *args, **kwargs) -> "Future[Dict[str, Any]]":
+        return self.submit(self.spotify.top_tracks, *args, **kwargs)
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,165 @@
+import heapq
+import itertools
+import math
+import threading
+import time
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from loguru import logger
+
+from ..config import Config
+
+
+class RateLimiter:
+    """Token bucket shared by the requests of a client, keeping them under the rate limit of the API.
+
+    Waiting requests are served by priority (lower first), then in arrival order. The rate halves whenever
+    the API rate limits the client, and recovers gradually with the successful requests.
+    """
+
+    def __init__(self, rate: float, burst: int, min_rate: Optional[float] = None, recovery: float = 0.05) -> None:
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate or rate / 10
+        self.burst = burst
+
+        # Fraction of the maximum rate regained after each successful request.
+        self.recovery = recovery
+
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+        # No tokens are handed out before this time (monotonic), set when rate limited.
+        self.blocked_until = 0.0
+
+        self.waiters: List[Tuple[int, int]] = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _wait_time(self, now: float) -> float:
+        """Get the seconds until a token is available."""
+        return max(self.blocked_until - now, (1 - self.tokens) / self.rate, 0)
+
+    def acquire(self, priority: int = 0, timeout: Optional[float] = None) -> bool:
+        """Wait for a token, returning False if none would be available within the timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waiter = (priority, next(self.counter))
+
+        with self.condition:
+            heapq.heappush(self.waiters, waiter)
+
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+
+                    # Only the first waiter by priority may take a token, the others wait for it to leave.
+                    wait = self._wait_time(now) if self.waiters[0] == waiter else None
+
+                    if wait == 0:
+                        self.tokens -= 1
+                        return True
+
+                    if deadline is not None:
+                        # Give up right away, instead of waiting for a token that would come too late.
+                        if (wait is not None and now + wait > deadline) or now >= deadline:
+                            return False
+
+                        wait = deadline - now if wait is None else wait
+
+                    self.condition.wait(wait)
+            finally:
+                self.waiters.remove(waiter)
+                heapq.heapify(self.waiters)
+
+                self.condition.notify_all()
+
+    def record_success(self) -> None:
+        """Regain some of the rate lost to rate limits."""
+        with self.condition:
+            if self.rate < self.max_rate:
+                self.rate = min(self.rate + self.max_rate * self.recovery, self.max_rate)
+
+    def penalize(self, retry_after: float) -> None:
+        """Stop handing out tokens for `retry_after` seconds, and halve the rate, after being rate limited."""
+        with self.condition:
+            now = time.monotonic()
+            self._refill(now)
+
+            self.blocked_until = max(self.blocked_until, now + retry_after)
+            self.tokens = 0
+            self.rate = max(self.rate / 2, self.min_rate)
+
+            self.condition.notify_all()
+
+        logger.warning(f"Ratelimited, Pausing the requests for {retry_after:.0f} seconds, at {self.rate:.2f} requests/s after.")
+
+    @staticmethod
+    def _parse_header(headers: Mapping[str, str], name: str) -> Optional[float]:
+        """Get a non-negative number from the header, None if it's missing or invalid."""
+        value = headers.get(name)
+
+        if value is None:
+            return None
+
+        try:
+            number = float(value)
+        except ValueError:
+            number = math.nan
+
+        if not math.isfinite(number) or number < 0:
+            logger.warning(f"Invalid {name} header: {value}")
+            return None
+
+        return number
+
+    def update(self, headers: Mapping[str, str]) -> None:
+        """Align the bucket with the remaining requests and the reset (in seconds), for the APIs sending them.
+
+        Invalid values are ignored, keeping the bucket as it is.
+        """
+        remaining = self._parse_header(headers, "X-RateLimit-Remaining")
+
+        if remaining is None:
+            return
+
+        reset = self._parse_header(headers, "X-RateLimit-Reset")
+
+        with self.condition:
+            now = time.monotonic()
+            self._refill(now)
+
+            self.tokens = min(self.tokens, remaining)
+
+            if self.tokens < 1 and reset is not None:
+                self.blocked_until = max(self.blocked_until, now + reset)
+
+    @property
+    def blocked_for(self) -> float:
+        """Get the seconds left until the requests are resumed."""
+        return max(self.blocked_until - time.monotonic(), 0)
+
+
+class RateLimiters:
+    """Rate limiters of every client id, shared by its clients as the API rate limits the client id."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+
+        self.limiters: Dict[str, RateLimiter] = {}
+        self.lock = threading.Lock()
+
+    def get(self, client_id: str) -> RateLimiter:
+        with self.lock:
+            if client_id not in self.limiters:
+                self.limiters[client_id] = RateLimiter(self.rate, self.burst)
+
+            return self.limiters[client_id]
+
+
+rate_limiters = RateLimiters(Config.SPOTIFY_RATE_LIMIT, Config.SPOTIFY_RATE_BURST)
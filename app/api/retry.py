@@ -0,0 +1,101 @@
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict
+
+from loguru import logger
+
+from ..config import Config
+
+
+class SpotifyUnavailableError(Exception):
+    """Raised when spotify can't be reached, and there is no cached response to serve instead."""
+
+
+@dataclass
+class RetryPolicy:
+    attempts: int = 3
+
+    # Backoff before the retries, doubling after each attempt up to the maximum.
+    base_delay: float = 0.5
+    max_delay: float = 8
+
+    def delay(self, attempt: int) -> float:
+        """Get the seconds to wait before retrying, after the failed attempt (starting at 0)."""
+        # Full jitter, so the retries from concurrent requests spread out instead of arriving together.
+        return random.uniform(0, min(self.base_delay * 2 ** attempt, self.max_delay))
+
+
+class CircuitBreaker:
+    """Stop sending requests to a host after consecutive failures, until the reset timeout has passed.
+
+    Once the timeout passes a single trial request is let through, closing the circuit if it succeeds and
+    opening it for another timeout if it fails.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_progress = False
+        self.lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.failures >= self.failure_threshold
+
+    def allow_request(self) -> bool:
+        """Check if a request may be sent, letting a single trial through once the circuit may reset."""
+        with self.lock:
+            if not self.is_open:
+                return True
+
+            if self.trial_in_progress or time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+
+            self.trial_in_progress = True
+            return True
+
+    def record_success(self) -> None:
+        with self.lock:
+            if self.is_open:
+                logger.info(f"Circuit for {self.name} closed, Requests succeed again.")
+
+            self.failures = 0
+            self.trial_in_progress = False
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+
+            if self.is_open:
+                if not self.trial_in_progress:
+                    logger.warning(f"Circuit for {self.name} opened after {self.failures} failures.")
+
+                self.opened_at = time.monotonic()
+                self.trial_in_progress = False
+
+
+class CircuitBreakers:
+    """Circuit breakers of every host, shared by the clients so an outage is detected once."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.lock = threading.Lock()
+
+    def get(self, host: str) -> CircuitBreaker:
+        with self.lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker(host, self.failure_threshold, self.reset_timeout)
+
+            return self.breakers[host]
+
+
+circuit_breakers = CircuitBreakers(Config.CIRCUIT_FAILURE_THRESHOLD, Config.CIRCUIT_RESET_TIMEOUT)
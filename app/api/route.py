@@ -1,6 +1,8 @@
 from dataclasses import dataclass
 
-BASE_URL = "https://api.spotify.com/v1"
+from ..config import Config
+
+BASE_URL = Config.SPOTIFY_API_URL
 
 
 @dataclass
@@ -11,3 +13,8 @@ class Route:
     @property
     def url(self) -> str:
         return BASE_URL + self.path
+
+    @property
+    def endpoint(self) -> str:
+        """Get the path without the query."""
+        return self.path.split("?")[0]
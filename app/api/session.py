@@ -0,0 +1,28 @@
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ..config import Config
+
+
+def create_session(pool_sizes: Optional[Dict[str, int]] = None, default_pool_size: Optional[int] = None) -> requests.Session:
+    """Create a keep-alive session, with a connection pool for every host sized as configured."""
+    if pool_sizes is None:
+        pool_sizes = Config.HTTP_POOL_SIZES
+
+    if default_pool_size is None:
+        default_pool_size = Config.HTTP_POOL_SIZE
+
+    session = requests.Session()
+
+    # Pool for any host without a configured size.
+    adapter = HTTPAdapter(pool_connections=len(pool_sizes) + 1, pool_maxsize=default_pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    # Requests picks the adapter with the longest matching prefix, so these take precedence.
+    for host, pool_size in pool_sizes.items():
+        session.mount(f"https://{host}", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+
+    return session
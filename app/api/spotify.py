@@ -1,28 +1,110 @@
 import base64
 import json
 import sys
+import threading
 import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from typing import Any, Dict, Literal, Optional, cast
+from urllib.parse import urlsplit
 
 import requests
 from loguru import logger
 
+from .cache import ResponseCache
+from .ratelimit import RateLimiter, rate_limiters
+from .retry import CircuitBreakers, RetryPolicy, SpotifyUnavailableError, circuit_breakers
 from .route import Route
+from .session import create_session
+from .token import TokenCache
 from ..config import Config
+from ..metrics import (
+    SPOTIFY_RATELIMITED,
+    SPOTIFY_REQUEST_SECONDS,
+    SPOTIFY_RETRIES,
+    SPOTIFY_STALE_RESPONSES,
+    SPOTIFY_TOKEN_REFRESH_SECONDS,
+    SPOTIFY_UNAVAILABLE,
+)
 
 PYTHON_VERSION = f"{sys.version_info.major}.{sys.version_info.minor}.{sys.version_info.micro}"
 
 
 class Spotify:
-    RETRY_ATTEMPTS = 3
     USER_AGENT = f"Spotify Twitter Banner ({Config.GITHUB_REPO_URL}) - Python/{PYTHON_VERSION} Requests/{requests.__version__}"
 
-    def __init__(self, client_id: str, client_secret: str) -> None:
+    def __init__(
+        self,
+        client_id: str,
+        client_secret: str,
+        session: Optional[requests.Session] = None,
+        cache: Optional[ResponseCache] = None,
+        refresh_token: Optional[str] = None,
+        token_cache_path: Optional[str] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        breakers: Optional[CircuitBreakers] = None,
+        rate_limiter: Optional[RateLimiter] = None
+    ) -> None:
         self.client_id = client_id
         self.client_secret = client_secret
 
-        self.bearer_info = None
-        self.refresh_token = Config.SPOTIFY_REFRESH_TOKEN
+        # Cache for the responses of the slow changing routes.
+        self.cache = cache
+
+        # Pooled keep-alive session, which can be shared with the album art cache.
+        self.session = session or create_session()
+        self.timeout = (Config.HTTP_CONNECT_TIMEOUT, Config.HTTP_READ_TIMEOUT)
+
+        # Backoff between the retries, and the circuit breakers of the hosts shared with the other clients.
+        self.retry_policy = retry_policy or RetryPolicy(
+            Config.SPOTIFY_RETRY_ATTEMPTS, Config.SPOTIFY_RETRY_BASE_DELAY, Config.SPOTIFY_RETRY_MAX_DELAY
+        )
+        self.breakers = breakers or circuit_breakers
+
+        # Request budget shared by the routes and the clients of the client id, learning from the ratelimits.
+        self.rate_limiter = rate_limiter or rate_limiters.get(client_id)
+
+        self.bearer_info: Optional[Dict[str, Any]] = None
+        self.refresh_token = refresh_token or Config.SPOTIFY_REFRESH_TOKEN
+
+        # Refreshes are single-flight, concurrent callers wait for the refresh in progress.
+        self.token_lock = threading.Lock()
+
+        token_cache_path = Config.TOKEN_CACHE_PATH if token_cache_path is None else token_cache_path
+        self.token_cache = TokenCache(token_cache_path, self.refresh_token) if token_cache_path else None
+
+        if self.token_cache:
+            self.bearer_info = self.token_cache.load()
+
+    def _is_token_valid(self) -> bool:
+        return self.bearer_info is not None and self.bearer_info["expires_at"] - Config.TOKEN_REFRESH_MARGIN > time.time()
+
+    def refresh_bearer_info(self, expired_token: Optional[str] = None) -> Dict[str, Any]:
+        """Refresh the bearer info, unless another caller already replaced the expired token."""
+        with self.token_lock:
+            current_token = self.bearer_info["access_token"] if self.bearer_info else None
+
+            if current_token is None or current_token == expired_token or not self._is_token_valid():
+                with SPOTIFY_TOKEN_REFRESH_SECONDS.time():
+                    bearer_info = self.get_bearer_info()
+                bearer_info["expires_at"] = time.time() + bearer_info.get("expires_in", 3600)
+
+                self.bearer_info = bearer_info
+
+                if self.token_cache:
+                    self.token_cache.save(bearer_info)
+
+            return cast(Dict[str, Any], self.bearer_info)
+
+    def get_access_token(self) -> str:
+        """Get the access token, refreshing it just before it expires."""
+        bearer_info = self.bearer_info
+
+        if bearer_info is None or not self._is_token_valid():
+            logger.debug("Access token is missing or about to expire, Refreshing.")
+            bearer_info = self.refresh_bearer_info()
+
+        return bearer_info["access_token"]
 
     def get_bearer_info(self) -> Dict[str, Any]:
         """Get the bearer info containing the access token to access the spotify endpoints."""
@@ -31,26 +113,53 @@ class Spotify:
 
         token = self.generate_base64_token()
 
+        url = f"{Config.SPOTIFY_ACCOUNTS_URL}/api/token"
         headers = {"Authorization": f"Basic {token}"}
         data = {
             "grant_type": "refresh_token",
             "refresh_token": self.refresh_token
         }
 
-        # Get the bearer info.
-        response = requests.post("https://accounts.spotify.com/api/token", headers=headers, data=data)
+        breaker = self.breakers.get(urlsplit(url).netloc)
 
-        # Check if the request was successful.
-        if response.status_code != 200:
-            raise Exception("Failed to get bearer info.")
+        # Get the bearer info, with the same retries and circuit breaker as the API requests.
+        for attempt in range(self.retry_policy.attempts):
+            if not breaker.allow_request():
+                raise SpotifyUnavailableError(f"Failed to get bearer info - Circuit for {breaker.name} is open.")
 
-        # Return the bearer info.
-        info = response.json()
+            try:
+                response = self.session.post(url, headers=headers, data=data, timeout=self.timeout)
+            except requests.RequestException as error:
+                logger.warning(f"Failed to get bearer info - {error}")
+
+                breaker.record_failure()
+                self._backoff(attempt)
+
+                continue
+
+            # Retry anything 5xx, after a backoff.
+            if response.status_code >= 500:
+                logger.warning(f"Failed to get bearer info - {response.status_code}")
+
+                breaker.record_failure()
+                self._backoff(attempt)
+
+                continue
 
-        if "error" in info:
-            raise Exception(f"Failed to get bearer info: {info['error']}")
+            breaker.record_success()
 
-        return info
+            try:
+                info = response.json()
+            except ValueError:
+                info = {}
+
+            # Check if the request was successful, client errors won't succeed by retrying.
+            if response.status_code != 200 or "error" in info:
+                raise SpotifyUnavailableError(f"Failed to get bearer info: {info.get('error', response.status_code)}")
+
+            return info
+
+        raise SpotifyUnavailableError("Failed to get bearer info - Spotify accounts service is unavailable.")
 
     def get_refresh_token(self, code: str) -> Dict[str, Any]:
         """Get the spotify refresh token using the `code` obtained after the OAuth2 authorization
@@ -67,7 +176,9 @@ class Spotify:
             "redirect_uri": Config.SPOTIFY_REDIRECT_URI,
         }
 
-        response = requests.post("https://accounts.spotify.com/api/token", headers=headers, data=data)
+        response = self.session.post(
+            f"{Config.SPOTIFY_ACCOUNTS_URL}/api/token", headers=headers, data=data, timeout=self.timeout
+        )
 
         return response.json()
 
@@ -77,18 +188,20 @@ class Spotify:
         *,
         headers: Optional[Dict[str, Any]] = None,
         data: Optional[Any] = None
-    ) -> Optional[Dict[str, Any]]:
+    ) -> Dict[str, Any]:
         if not headers:
             headers = {}
 
-        # Check if Authorization exists.
-        if "Authorization" not in headers:
-            # Check if bearer info exists.
-            if self.bearer_info is None:
-                self.bearer_info = self.get_bearer_info()
+        # Serve the cached response, if it is still fresh.
+        if self.cache is not None:
+            cached = self.cache.get(route)
+
+            if cached is not None:
+                logger.debug(f"[{route.method}] (cached) {route.url}")
+                return cached
 
-            # Set the Authorization header.
-            headers["Authorization"] = f"Bearer {self.bearer_info['access_token']}"
+        # Use the access token, unless the Authorization is specified.
+        use_access_token = "Authorization" not in headers
 
         headers = {
             "User-Agent": self.USER_AGENT,
@@ -96,53 +209,150 @@ class Spotify:
             **headers
         }
 
+        breaker = self.breakers.get(urlsplit(route.url).netloc)
+
         # Perform request with retries.
-        for _ in range(self.RETRY_ATTEMPTS):
-            response = requests.request(route.method, route.url, headers=headers, json=data)
+        for attempt in range(self.retry_policy.attempts):
+            # Don't send requests while the host keeps failing, or over the request budget.
+            if not breaker.allow_request():
+                logger.warning(f"Failed to fetch: {route.url} - Circuit for {breaker.name} is open.")
+                break
+
+            if not self.rate_limiter.acquire(self._priority(route), timeout=Config.SPOTIFY_RATE_LIMIT_WAIT):
+                SPOTIFY_RATELIMITED.labels(route=route.endpoint).inc()
+                logger.warning(f"Failed to fetch: {route.url} - Ratelimited for {self.rate_limiter.blocked_for:.0f} seconds.")
+                break
+
+            if use_access_token:
+                try:
+                    access_token = self.get_access_token()
+                except SpotifyUnavailableError as error:
+                    logger.warning(f"Failed to fetch: {route.url} - {error}")
+                    break
+
+                headers["Authorization"] = f"Bearer {access_token}"
+
+            try:
+                with SPOTIFY_REQUEST_SECONDS.labels(route=route.endpoint).time():
+                    response = self.session.request(route.method, route.url, headers=headers, json=data, timeout=self.timeout)
+            except requests.RequestException as error:
+                logger.warning(f"[{route.method}] {route.url} - {error}")
+                SPOTIFY_RETRIES.labels(route=route.endpoint).inc()
+
+                breaker.record_failure()
+                self._backoff(attempt)
+
+                continue
 
             logger.debug(f"[{route.method}] ({response.status_code}) {route.url}")
 
+            # Retry anything 5xx, after a backoff.
+            if response.status_code >= 500:
+                SPOTIFY_RETRIES.labels(route=route.endpoint).inc()
+                breaker.record_failure()
+                self._backoff(attempt)
+
+                continue
+
+            breaker.record_success()
+            self.rate_limiter.update(response.headers)
+
             # Check if the request was successful.
             if response.status_code == 200:
-                return response.json()
+                self.rate_limiter.record_success()
+                result = response.json()
+
+                if self.cache is not None:
+                    self.cache.set(route, result)
+
+                return result
 
             try:
-                data = json.loads(response.text)
+                payload = json.loads(response.text)
             except json.decoder.JSONDecodeError:
-                data = None
+                payload = None
 
+            # Other successes, such as no content while nothing is playing.
             if 200 <= response.status_code < 300:
-                return data
+                return payload or {}
 
-            # Handle ratelimited requests
+            # Handle ratelimited requests, pausing the requests and slowing down instead of waiting for the limit to reset.
             if response.status_code == 429:
-                retry_after = int(response.headers["Retry-After"])
-
-                logger.info(f"Ratelimited, Waiting for {retry_after} seconds.")
-                time.sleep(retry_after)
-
-                continue
+                SPOTIFY_RATELIMITED.labels(route=route.endpoint).inc()
+                self.rate_limiter.penalize(self._retry_after(response))
+                break
 
             # Handle access token expired
-            if response.status_code == 401:
+            if response.status_code == 401 and use_access_token:
                 logger.info("Bearer info expired, Refreshing.")
-                self.bearer_info = self.get_bearer_info()
+                SPOTIFY_RETRIES.labels(route=route.endpoint).inc()
 
-                continue
+                try:
+                    self.refresh_bearer_info(expired_token=access_token)
+                except SpotifyUnavailableError as error:
+                    logger.warning(f"Failed to fetch: {route.url} - {error}")
+                    break
 
-            # Ignore anything 5xx
-            if response.status_code >= 500:
                 continue
 
-            # Route not found error - This won't happen most of the times
+            # Any other client error won't succeed by retrying, keep the last response instead.
             if response.status_code == 404:
+                # Route not found error - This won't happen most of the times
                 logger.warning(f"Failed to fetch: {route.url} - Route not found.")
-                return None
-
-            # If it's an internal route for the app
-            if response.status_code == 403:
+            elif response.status_code == 403:
+                # If it's an internal route for the app
                 logger.warning(f"Failed to fetch: {route.url} - Forbidden route.")
-                return None
+            else:
+                logger.warning(f"Failed to fetch: {route.url} - {response.status_code} {payload}")
+
+            break
+
+        return self._serve_stale(route)
+
+    def _retry_after(self, response: requests.Response) -> float:
+        """Get the seconds to wait from the Retry-After header, given as seconds or as a HTTP date."""
+        retry_after = response.headers.get("Retry-After")
+
+        if retry_after is None:
+            return self.retry_policy.max_delay
+
+        try:
+            return max(float(retry_after), 0)
+        except ValueError:
+            pass
+
+        try:
+            retry_at = parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            logger.warning(f"Invalid Retry-After header: {retry_after}")
+            return self.retry_policy.max_delay
+
+        # HTTP dates are in GMT, even without the timezone.
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+
+        return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0)
+
+    @staticmethod
+    def _priority(route: Route) -> int:
+        return Config.ROUTE_PRIORITIES.get(route.endpoint, Config.DEFAULT_ROUTE_PRIORITY)
+
+    def _backoff(self, attempt: int) -> None:
+        """Wait before retrying the failed attempt, unless it was the last one."""
+        if attempt + 1 < self.retry_policy.attempts:
+            time.sleep(self.retry_policy.delay(attempt))
+
+    def _serve_stale(self, route: Route) -> Dict[str, Any]:
+        """Serve the last cached response of the route after the retries ran out, or raise if there is none."""
+        stale = self.cache.get_stale(route) if self.cache is not None else None
+
+        if stale is None:
+            SPOTIFY_UNAVAILABLE.labels(route=route.endpoint).inc()
+            raise SpotifyUnavailableError(f"Failed to fetch: {route.url} - Spotify is unavailable.")
+
+        SPOTIFY_STALE_RESPONSES.labels(route=route.endpoint).inc()
+        logger.warning(f"Spotify is unavailable, Serving the cached response of {route.url}")
+        return stale
 
     # Utility methods
     def generate_base64_token(self) -> str:
@@ -155,7 +365,7 @@ class Spotify:
         return url
 
     # Main endpoints
-    def currently_playing(self) -> Optional[Dict[str, Any]]:
+    def currently_playing(self) -> Dict[str, Any]:
         """Get the currently playing song/podcast."""
         route = Route(
             "GET",
@@ -175,6 +385,12 @@ class Spotify:
 
         return False
 
+    def queue(self) -> Dict[str, Any]:
+        """Get the currently playing song/podcast, and the ones queued after it."""
+        route = Route("GET", "/me/player/queue")
+
+        return self.fetch(route)
+
     def recently_played(
         self,
         limit: int = 20,
@@ -195,7 +411,7 @@ class Spotify:
             self._form_url("/me/player/recently-played", data)
         )
 
-        return cast(Dict[str, Any], self.fetch(route))
+        return self.fetch(route)
 
     def top_tracks(
         self,
@@ -217,4 +433,4 @@ class Spotify:
             self._form_url("/me/top/tracks", data)
         )
 
-        return cast(Dict[str, Any], self.fetch(route))
+        return self.fetch(route)
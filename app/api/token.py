@@ -0,0 +1,47 @@
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+
+from loguru import logger
+
+
+class TokenCache:
+    """Access token cache on disk, readable only by the owner, so restarts can reuse a valid token."""
+
+    def __init__(self, path: str, refresh_token: str) -> None:
+        self.path = path
+
+        # Tokens are only reused for the same refresh token, without storing the refresh token itself.
+        self.owner = hashlib.sha256(refresh_token.encode()).hexdigest()
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """Load the cached bearer info, if it belongs to the refresh token and hasn't expired."""
+        try:
+            with open(self.path) as file:
+                cached = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        if cached.get("owner") != self.owner or cached.get("expires_at", 0) <= time.time():
+            return None
+
+        return cached["bearer_info"]
+
+    def save(self, bearer_info: Dict[str, Any]) -> None:
+        """Store the bearer info, which must have the `expires_at` timestamp set."""
+        directory = os.path.dirname(self.path)
+
+        try:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            # Create the file with owner only permissions, and restrict an existing file too.
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            os.chmod(self.path, 0o600)
+
+            with os.fdopen(fd, "w") as file:
+                json.dump({"owner": self.owner, "expires_at": bearer_info["expires_at"], "bearer_info": bearer_info}, file)
+        except OSError as error:
+            logger.warning(f"Failed to cache the access token: {error}")
@@ -0,0 +1,75 @@
+import sys
+from dataclasses import dataclass
+from typing import Optional
+
+import tweepy
+from loguru import logger
+
+from .api.cache import ResponseCache
+from .api.concurrent import ConcurrentSpotify
+from .api.session import create_session
+from .api.spotify import Spotify
+from .config import Config, LoggerConfig
+from .history import ListeningHistory, open_history
+from .image.art import art_cache
+from .twitter import create_twitter_api
+
+
+@dataclass
+class Clients:
+    """Clients of the account configured in the environment."""
+    spotify: Spotify
+    concurrent_spotify: ConcurrentSpotify
+    twitter: tweepy.API
+    history: Optional[ListeningHistory]
+
+
+def configure_logging() -> None:
+    """Log to the console and the rotated log file, only done by the main process of the entry points."""
+    logger.configure(
+        handlers=[
+            dict(
+                sink=sys.stdout,
+                format=LoggerConfig.LOG_FORMAT,
+                level=LoggerConfig.LOG_LEVEL,
+            ),
+            dict(
+                sink=LoggerConfig.LOG_FILE,
+                format=LoggerConfig.LOG_FORMAT,
+                level=LoggerConfig.LOG_LEVEL,
+                rotation=LoggerConfig.LOG_FILE_SIZE,
+                retention=LoggerConfig.LOG_FILE_RETENTION,
+            ),
+        ]
+    )
+
+
+def create_clients() -> Clients:
+    """Create the clients of the account configured in the environment.
+
+    Only called by the entry points, so importing the package, as the render processes do, has no side effects.
+    """
+    # Pooled HTTP session, shared by the Spotify API and the album art downloads.
+    session = create_session()
+    art_cache.session = session
+
+    # Cache of the slow changing Spotify responses.
+    response_cache = ResponseCache(
+        Config.RESPONSE_CACHE_TTLS, Config.RESPONSE_CACHE_PATH or None, max_stale=Config.STALE_CACHE_MAX_AGE
+    )
+
+    # Local history of the recently played tracks.
+    history = open_history(Config.HISTORY_PATH, Config.HISTORY_MAX_PLAYS) if Config.HISTORY_PATH else None
+
+    # Initialize the Spotify API
+    spotify = Spotify(Config.SPOTIFY_CLIENT_ID, Config.SPOTIFY_CLIENT_SECRET, session=session, cache=response_cache)
+
+    # Initialize the twitter API
+    twitter = create_twitter_api(
+        Config.TWITTER_CONSUMER_KEY,
+        Config.TWITTER_CONSUMER_SECRET,
+        Config.TWITTER_ACCESS_TOKEN,
+        Config.TWITTER_ACCESS_TOKEN_SECRET,
+    )
+
+    return Clients(spotify, ConcurrentSpotify(spotify, max_workers=Config.HTTP_POOL_SIZE), twitter, history)
@@ -1,27 +1,118 @@
+import os
 from typing import cast
 
-from decouple import config
+from decouple import config, undefined
+
+# Credentials of a single account are only required without an accounts file.
+CREDENTIAL_DEFAULT = "" if config("ACCOUNTS_FILE", default="") else undefined
 
 
 class Config:
     # Debug mode
     DEBUG = cast(bool, config("DEBUG", default=False, cast=bool))
 
-    # Update interval (in minutes)
+    # Update interval (in minutes), the longest wait between updates while a song is playing.
     UPDATE_INTERVAL = cast(int, config("UPDATE_INTERVAL", default=2, cast=int))
 
+    # Shortest wait between updates, and the longest wait while nothing is playing (in seconds).
+    MIN_UPDATE_INTERVAL = cast(int, config("MIN_UPDATE_INTERVAL", default=10, cast=int))
+    IDLE_UPDATE_INTERVAL = cast(int, config("IDLE_UPDATE_INTERVAL", default=30 * 60, cast=int))
+
+    # Time to wait after a song should end (in seconds), and the ratio to randomize the waits by.
+    TRACK_END_GRACE = cast(float, config("TRACK_END_GRACE", default=3, cast=float))
+    UPDATE_JITTER = cast(float, config("UPDATE_JITTER", default=0.1, cast=float))
+
+    # File with the credentials of the accounts, to run the banners of multiple accounts.
+    ACCOUNTS_FILE = cast(str, config("ACCOUNTS_FILE", default=""))
+
     # Spotify refresh token for headless environments
-    SPOTIFY_REFRESH_TOKEN = cast(str, config("SPOTIFY_REFRESH_TOKEN"))
+    SPOTIFY_REFRESH_TOKEN = cast(str, config("SPOTIFY_REFRESH_TOKEN", default=CREDENTIAL_DEFAULT))
 
     # Spotify credentials
-    SPOTIFY_CLIENT_ID = cast(str, config("SPOTIFY_CLIENT_ID"))
-    SPOTIFY_CLIENT_SECRET = cast(str, config("SPOTIFY_CLIENT_SECRET"))
+    SPOTIFY_CLIENT_ID = cast(str, config("SPOTIFY_CLIENT_ID", default=CREDENTIAL_DEFAULT))
+    SPOTIFY_CLIENT_SECRET = cast(str, config("SPOTIFY_CLIENT_SECRET", default=CREDENTIAL_DEFAULT))
 
     # Twitter credentials
-    TWITTER_CONSUMER_KEY = cast(str, config("TWITTER_CONSUMER_KEY"))
-    TWITTER_CONSUMER_SECRET = cast(str, config("TWITTER_CONSUMER_SECRET"))
-    TWITTER_ACCESS_TOKEN = cast(str, config("TWITTER_ACCESS_TOKEN"))
-    TWITTER_ACCESS_TOKEN_SECRET = cast(str, config("TWITTER_ACCESS_TOKEN_SECRET"))
+    TWITTER_CONSUMER_KEY = cast(str, config("TWITTER_CONSUMER_KEY", default=CREDENTIAL_DEFAULT))
+    TWITTER_CONSUMER_SECRET = cast(str, config("TWITTER_CONSUMER_SECRET", default=CREDENTIAL_DEFAULT))
+    TWITTER_ACCESS_TOKEN = cast(str, config("TWITTER_ACCESS_TOKEN", default=CREDENTIAL_DEFAULT))
+    TWITTER_ACCESS_TOKEN_SECRET = cast(str, config("TWITTER_ACCESS_TOKEN_SECRET", default=CREDENTIAL_DEFAULT))
+
+    # Workers for the network I/O of the accounts, and processes for rendering their banners.
+    ACCOUNT_WORKERS = cast(int, config("ACCOUNT_WORKERS", default=8, cast=int))
+    RENDER_WORKERS = cast(int, config("RENDER_WORKERS", default=os.cpu_count() or 1, cast=int))
+
+    # Workers uploading the banners, and the size of the queues between the stages of the banner pipeline.
+    UPLOAD_WORKERS = cast(int, config("UPLOAD_WORKERS", default=2, cast=int))
+    PIPELINE_QUEUE_SIZE = cast(int, config("PIPELINE_QUEUE_SIZE", default=16, cast=int))
+
+    # Directory for the token and response caches of each account, disabled if empty.
+    ACCOUNTS_CACHE_DIR = cast(str, config("ACCOUNTS_CACHE_DIR", default=".cache/accounts"))
+
+    # Base URL of the Twitter API, to use a stand-in server instead of Twitter.
+    TWITTER_API_URL = cast(str, config("TWITTER_API_URL", default=""))
+
+    # Base URLs of the Spotify API, and the Spotify accounts service used for tokens.
+    SPOTIFY_API_URL = cast(str, config("SPOTIFY_API_URL", default="https://api.spotify.com/v1"))
+    SPOTIFY_ACCOUNTS_URL = cast(str, config("SPOTIFY_ACCOUNTS_URL", default="https://accounts.spotify.com"))
+
+    # Fetch the recently played tracks alongside the currently playing track, instead of only when nothing is
+    # playing, so that the idle cycles don't wait for a second request. Off by default, as it costs every playing
+    # cycle a request and a sync of the history.
+    PREFETCH_RECENTLY_PLAYED = cast(bool, config("PREFETCH_RECENTLY_PLAYED", default=False, cast=bool))
+
+    # Local history of the recently played tracks, which the track shown while nothing is playing is picked from.
+    # It's disabled by setting the path to be empty.
+    HISTORY_PATH = cast(str, config("HISTORY_PATH", default=".cache/history.sqlite3"))
+    HISTORY_MAX_PLAYS = cast(int, config("HISTORY_MAX_PLAYS", default=1000, cast=int))
+
+    # Access token cache, and how long before the expiry (in seconds) the access token is refreshed.
+    TOKEN_CACHE_PATH = cast(str, config("TOKEN_CACHE_PATH", default=".cache/spotify-token.json"))
+    TOKEN_REFRESH_MARGIN = cast(int, config("TOKEN_REFRESH_MARGIN", default=60, cast=int))
+
+    # Cache of the slow changing Spotify responses, with the TTL (in seconds) of each route. Caching to the disk
+    # is disabled by setting the path to be empty.
+    RESPONSE_CACHE_PATH = cast(str, config("RESPONSE_CACHE_PATH", default=".cache/spotify-responses.json"))
+    RESPONSE_CACHE_TTLS = {
+        "/me/top/tracks": cast(int, config("TOP_TRACKS_CACHE_TTL", default=6 * 60 * 60, cast=int)),
+        "/me/player/recently-played": cast(int, config("RECENTLY_PLAYED_CACHE_TTL", default=10 * 60, cast=int)),
+    }
+
+    # How long (in seconds) expired responses are kept, to serve them while spotify is unavailable.
+    STALE_CACHE_MAX_AGE = cast(int, config("STALE_CACHE_MAX_AGE", default=24 * 60 * 60, cast=int))
+
+    # Attempts for the Spotify requests, with the backoff (in seconds) between them doubling up to the maximum.
+    SPOTIFY_RETRY_ATTEMPTS = cast(int, config("SPOTIFY_RETRY_ATTEMPTS", default=3, cast=int))
+    SPOTIFY_RETRY_BASE_DELAY = cast(float, config("SPOTIFY_RETRY_BASE_DELAY", default=0.5, cast=float))
+    SPOTIFY_RETRY_MAX_DELAY = cast(float, config("SPOTIFY_RETRY_MAX_DELAY", default=8, cast=float))
+
+    # Requests per second shared by the Spotify routes, the burst allowed above it, and how long (in seconds) a
+    # request may wait for the budget before it's treated as ratelimited.
+    SPOTIFY_RATE_LIMIT = cast(float, config("SPOTIFY_RATE_LIMIT", default=2, cast=float))
+    SPOTIFY_RATE_BURST = cast(int, config("SPOTIFY_RATE_BURST", default=10, cast=int))
+    SPOTIFY_RATE_LIMIT_WAIT = cast(float, config("SPOTIFY_RATE_LIMIT_WAIT", default=10, cast=float))
+
+    # Priority of the routes for the rate limit budget, lower is served first and the rest use the default.
+    ROUTE_PRIORITIES = {
+        "/me/player/currently-playing": 0,
+    }
+    DEFAULT_ROUTE_PRIORITY = 1
+
+    # Consecutive failures after which the requests to a host are stopped, and for how long (in seconds).
+    CIRCUIT_FAILURE_THRESHOLD = cast(int, config("CIRCUIT_FAILURE_THRESHOLD", default=5, cast=int))
+    CIRCUIT_RESET_TIMEOUT = cast(float, config("CIRCUIT_RESET_TIMEOUT", default=30, cast=float))
+
+    # HTTP timeouts (in seconds) for connecting, and for reading the response.
+    HTTP_CONNECT_TIMEOUT = cast(float, config("HTTP_CONNECT_TIMEOUT", default=5, cast=float))
+    HTTP_READ_TIMEOUT = cast(float, config("HTTP_READ_TIMEOUT", default=15, cast=float))
+
+    # Size of the keep-alive connection pools, per host and for any other host.
+    HTTP_POOL_SIZE = cast(int, config("HTTP_POOL_SIZE", default=4, cast=int))
+    HTTP_POOL_SIZES = {
+        "api.spotify.com": 4,
+        "accounts.spotify.com": 1,
+        "i.scdn.co": 4,
+    }
 
     # Redirect URI, Used for OAuth.
     SPOTIFY_REDIRECT_URI = cast(str, config("SPOTIFY_REDIRECT_URI", default="http://localhost:8888/callback"))
@@ -30,12 +121,57 @@ class Config:
     SCOPES = [
         "user-read-currently-playing",
         "user-read-recently-played",
-        "user-top-read"
+        "user-top-read",
+        "user-read-playback-state"
     ]
 
     # Path to save the spotify banner image.
     IMAGE_PATH = "spotify-banner.jpeg"
 
+    # Layout template of the banner, compiled when the app starts.
+    LAYOUT_PATH = cast(str, config("LAYOUT_PATH", default="app/assets/layouts/default.json"))
+
+    # Only keep the banner in memory for the upload, instead of also saving it to `IMAGE_PATH`.
+    IN_MEMORY_UPLOAD = cast(bool, config("IN_MEMORY_UPLOAD", default=False, cast=bool))
+
+    # Attempts to upload a banner when twitter or the network fails, with the backoff (in seconds) between them
+    # doubling up to the maximum.
+    UPLOAD_RETRY_ATTEMPTS = cast(int, config("UPLOAD_RETRY_ATTEMPTS", default=5, cast=int))
+    UPLOAD_RETRY_BASE_DELAY = cast(float, config("UPLOAD_RETRY_BASE_DELAY", default=5, cast=float))
+    UPLOAD_RETRY_MAX_DELAY = cast(float, config("UPLOAD_RETRY_MAX_DELAY", default=300, cast=float))
+
+    # Encoding of the banner. The quality is searched within the range to fit the target size (in bytes), or
+    # to stay above the PSNR floor (in dB). Both are disabled with 0, encoding with the maximum quality.
+    JPEG_TARGET_SIZE = cast(int, config("JPEG_TARGET_SIZE", default=0, cast=int))
+    JPEG_MIN_PSNR = cast(float, config("JPEG_MIN_PSNR", default=0, cast=float))
+    JPEG_MIN_QUALITY = cast(int, config("JPEG_MIN_QUALITY", default=60, cast=int))
+    JPEG_MAX_QUALITY = cast(int, config("JPEG_MAX_QUALITY", default=100, cast=int))
+
+    # Pre-render the banner of the next track in the queue, to upload it as soon as the track starts. Needs the
+    # `user-read-playback-state` scope.
+    SPECULATIVE_PRERENDER = cast(bool, config("SPECULATIVE_PRERENDER", default=False, cast=bool))
+
+    # Fraction of the banner pixels that must visibly change to upload a progress only update, 0 uploads any change.
+    MIN_VISUAL_CHANGE = cast(float, config("MIN_VISUAL_CHANGE", default=0, cast=float))
+
+    # Path to store the fingerprint of the last published banner.
+    FINGERPRINT_PATH = cast(str, config("FINGERPRINT_PATH", default=".banner-fingerprint"))
+
+    # Album art cache, the number of decoded images kept in memory and the size of the disk cache (in bytes).
+    ART_CACHE_DIR = cast(str, config("ART_CACHE_DIR", default=".cache/art"))
+    ART_CACHE_MEMORY_SIZE = cast(int, config("ART_CACHE_MEMORY_SIZE", default=32, cast=int))
+    ART_CACHE_DISK_SIZE = cast(int, config("ART_CACHE_DISK_SIZE", default=50 * 1024 * 1024, cast=int))
+
+    # Port to serve the metrics on at `/metrics`, and the seconds between logging them. Both are disabled with 0.
+    METRICS_PORT = cast(int, config("METRICS_PORT", default=0, cast=int))
+    METRICS_HOST = cast(str, config("METRICS_HOST", default="127.0.0.1"))
+    METRICS_LOG_INTERVAL = cast(int, config("METRICS_LOG_INTERVAL", default=5 * 60, cast=int))
+
+    # Profile every Nth cycle to the profiles directory keeping the last profiles, disabled with 0.
+    PROFILE_EVERY = cast(int, config("PROFILE_EVERY", default=0, cast=int))
+    PROFILE_PATH = cast(str, config("PROFILE_PATH", default="logs/profiles"))
+    PROFILE_KEEP = cast(int, config("PROFILE_KEEP", default=20, cast=int))
+
     # Status for the song info.
     STATUS_MAPPING = {
         True: ["Vibing to", "Binging to", "Listening to", "Obsessed with"],
@@ -59,8 +195,9 @@ class LoggerConfig:
         "<cyan>{name: <18}</cyan> | <level>{message}</level>"
     )
 
-    # File Rotation size.
-    LOG_FILE_SIZE = "500 MB"
+    # File Rotation size, and the number of rotated files kept. Bounds the disk used by the logs.
+    LOG_FILE_SIZE = "10 MB"
+    LOG_FILE_RETENTION = 5
 
 
 class Fonts:
@@ -0,0 +1,310 @@
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Callable, List, Optional, Set, cast
+
+import requests
+import tweepy
+from loguru import logger
+
+from .accounts import Account
+from .api.cache import ResponseCache
+from .api.ratelimit import rate_limiters
+from .api.retry import SpotifyUnavailableError
+from .api.session import create_session
+from .api.spotify import Spotify
+from .config import Config
+from .fingerprint import FingerprintStore, compute_fingerprint
+from .history import ListeningHistory, open_history
+from .image.art import art_cache
+from .metrics import BANNER_UPDATES_SKIPPED, CYCLE_SECONDS, TWITTER_UPLOADS
+from .pipeline import BannerJob, BannerPipeline, StageError
+from .profiling import profiler
+from .scheduler import Scheduler
+from .twitter import create_twitter_api, is_transient_error, update_twitter_banner, upload_retry_policy
+from .utils import get_song_info, get_status
+
+
+def default_scheduler() -> Scheduler:
+    return Scheduler(
+        Config.MIN_UPDATE_INTERVAL,
+        Config.UPDATE_INTERVAL * 60,
+        Config.IDLE_UPDATE_INTERVAL,
+        track_end_grace=Config.TRACK_END_GRACE,
+        jitter=Config.UPDATE_JITTER,
+    )
+
+
+@dataclass
+class AccountState:
+    account: Account
+
+    spotify: Spotify
+    twitter: tweepy.API
+
+    scheduler: Scheduler
+    fingerprints: Optional[FingerprintStore]
+    history: Optional[ListeningHistory] = None
+
+    # When the next cycle is due (monotonic), and the failures in a row to back off from.
+    next_run: float = 0
+    failures: int = 0
+
+    # Sequence of the latest banner job, and the fingerprint of the banner in the pipeline.
+    sequence: int = 0
+    pending_fingerprint: Optional[str] = None
+
+    # When twitter accepts uploads again (epoch), after being rate limited.
+    upload_blocked_until: float = 0
+
+    # Guards the banner fields above, which the cycles and the pipeline workers update.
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+
+class BannerEngine:
+    """Update the banners of multiple accounts, sharing the worker pools between them.
+
+    The cycles of the accounts fetch on a thread pool for the network I/O, and hand the banners over to the
+    pipeline, which renders on a process pool to use all the cores and uploads on its own workers. Every account
+    has its own clients, tokens and schedule, and a failing or rate limited account only delays itself.
+    """
+
+    def __init__(
+        self,
+        accounts: List[Account],
+        io_workers: int = Config.ACCOUNT_WORKERS,
+        render_workers: int = Config.RENDER_WORKERS,
+        scheduler_factory: Callable[[], Scheduler] = default_scheduler,
+        skip_unchanged: bool = True
+    ) -> None:
+        # Connections are pooled across the accounts, sized for the I/O workers.
+        self.session = create_session(
+            {host: max(size, io_workers) for host, size in Config.HTTP_POOL_SIZES.items()}, io_workers
+        )
+        art_cache.session = self.session
+
+        self.io_pool = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="account")
+
+        self.pipeline = BannerPipeline(
+            self._upload,
+            render_workers,
+            upload_workers=Config.UPLOAD_WORKERS,
+            queue_size=Config.PIPELINE_QUEUE_SIZE,
+            on_discard=self._discard,
+        )
+        self.pipeline.start()
+
+        self.scheduler_factory = scheduler_factory
+        self.skip_unchanged = skip_unchanged
+
+        # Backoff between the retries of the uploads failing on a server or network error.
+        self.upload_retry_policy = upload_retry_policy()
+
+        self.states = [self._create_state(account) for account in accounts]
+        self.states_by_name = {state.account.name: state for state in self.states}
+
+        # Accounts with a cycle in progress.
+        self.running: Set[str] = set()
+        self.lock = threading.Lock()
+
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+
+        # Completed and failed cycles of each account.
+        self.cycles: Counter = Counter()
+        self.failures: Counter = Counter()
+
+    def _cache_path(self, account: Account, name: str) -> str:
+        if not Config.ACCOUNTS_CACHE_DIR:
+            return ""
+
+        return os.path.join(Config.ACCOUNTS_CACHE_DIR, account.name, name)
+
+    def _create_state(self, account: Account) -> AccountState:
+        response_cache_path = self._cache_path(account, "spotify-responses.json")
+        fingerprint_path = self._cache_path(account, "banner-fingerprint")
+
+        if fingerprint_path:
+            os.makedirs(os.path.dirname(fingerprint_path), exist_ok=True)
+
+        spotify = Spotify(
+            account.spotify_client_id,
+            account.spotify_client_secret,
+            session=self.session,
+            cache=ResponseCache(Config.RESPONSE_CACHE_TTLS, response_cache_path or None, max_stale=Config.STALE_CACHE_MAX_AGE),
+            refresh_token=account.spotify_refresh_token,
+            token_cache_path=self._cache_path(account, "spotify-token.json"),
+            rate_limiter=rate_limiters.get(account.spotify_client_id),
+        )
+        twitter = create_twitter_api(
+            account.twitter_consumer_key,
+            account.twitter_consumer_secret,
+            account.twitter_access_token,
+            account.twitter_access_token_secret,
+        )
+
+        fingerprints = FingerprintStore(fingerprint_path) if self.skip_unchanged and fingerprint_path else None
+
+        history_path = self._cache_path(account, "history.sqlite3") if Config.HISTORY_PATH else ""
+        history = open_history(history_path, Config.HISTORY_MAX_PLAYS) if history_path else None
+
+        return AccountState(account, spotify, twitter, self.scheduler_factory(), fingerprints, history)
+
+    def run(self, duration: Optional[float] = None) -> None:
+        """Run the cycles of the accounts as they are due, until stopped or for the duration (in seconds)."""
+        deadline = None if duration is None else time.monotonic() + duration
+
+        while not self.stopped.is_set():
+            now = time.monotonic()
+
+            if deadline is not None and now >= deadline:
+                break
+
+            next_due = now + 1
+
+            with self.lock:
+                for state in self.states:
+                    if state.account.name in self.running:
+                        continue
+
+                    if state.next_run <= now:
+                        self.running.add(state.account.name)
+                        self.io_pool.submit(self._run_account, state)
+                    else:
+                        next_due = min(next_due, state.next_run)
+
+            if deadline is not None:
+                next_due = min(next_due, deadline)
+
+            self.wakeup.wait(max(next_due - time.monotonic(), 0))
+            self.wakeup.clear()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.wakeup.set()
+
+        self.io_pool.shutdown(wait=True)
+        self.pipeline.stop()
+
+    def _run_account(self, state: AccountState) -> None:
+        name = state.account.name
+
+        try:
+            with profiler.cycle(name):
+                delay = self.run_cycle(state)
+
+            state.failures = 0
+
+            self.cycles[name] += 1
+        except SpotifyUnavailableError as error:
+            # Keep the current banner, and back off until spotify recovers.
+            delay = state.scheduler.next_delay(None)
+
+            logger.warning(f"[{name}] {error} Keeping the current banner, Retrying in {delay:.0f} seconds.")
+            self.failures[name] += 1
+        except Exception:
+            state.failures += 1
+            delay = min(Config.MIN_UPDATE_INTERVAL * 2 ** state.failures, Config.IDLE_UPDATE_INTERVAL)
+
+            logger.exception(f"[{name}] Failed to update the banner, Retrying in {delay:.0f} seconds.")
+            self.failures[name] += 1
+
+        with self.lock:
+            state.next_run = time.monotonic() + delay
+            self.running.discard(name)
+
+        self.wakeup.set()
+
+    def run_cycle(self, state: AccountState) -> float:
+        """Fetch the state of the account and queue its banner, returning the seconds to wait for the next cycle."""
+        start = time.monotonic()
+
+        top_tracks = [track for track in state.spotify.top_tracks(limit=5)["items"]]
+        song = get_song_info(spotify=state.spotify, history=state.history)
+        status = get_status(song)
+
+        fingerprint = compute_fingerprint(status, song, top_tracks)
+        job = None
+
+        with state.lock:
+            if self.skip_unchanged and fingerprint == state.pending_fingerprint:
+                logger.debug(f"[{state.account.name}] Banner is already queued, Skipping the update.")
+                BANNER_UPDATES_SKIPPED.labels(reason="queued").inc()
+            elif state.fingerprints is not None and state.fingerprints.matches(fingerprint):
+                logger.debug(f"[{state.account.name}] Banner is unchanged, Skipping the update.")
+                BANNER_UPDATES_SKIPPED.labels(reason="unchanged").inc()
+            elif state.upload_blocked_until > time.time():
+                logger.debug(f"[{state.account.name}] Rate limited by twitter, Skipping the update.")
+                BANNER_UPDATES_SKIPPED.labels(reason="ratelimited").inc()
+            else:
+                state.sequence += 1
+                state.pending_fingerprint = fingerprint
+
+                job = BannerJob.create(state.account.name, state.sequence, status, song, top_tracks, fingerprint)
+
+        # Submit outside of the lock, as it waits while the pipeline is full.
+        if job is not None:
+            self.pipeline.submit(job)
+
+        CYCLE_SECONDS.observe(time.monotonic() - start)
+
+        return state.scheduler.next_delay(song, elapsed=time.monotonic() - start)
+
+    def _upload(self, job: BannerJob) -> None:
+        """Upload the rendered banner of the job, the last stage of the pipeline.
+
+        Uploads failing on a server or network error are retried on the upload worker, until a newer banner of the
+        account replaces the job.
+        """
+        state = self.states_by_name[job.account]
+        attempts = 0
+
+        while True:
+            try:
+                update_twitter_banner(state.twitter, BytesIO(cast(bytes, job.banner)))
+                break
+            except tweepy.TooManyRequests as error:
+                with state.lock:
+                    state.upload_blocked_until = int(error.response.headers.get("x-rate-limit-reset", 0))
+                TWITTER_UPLOADS.labels(result="ratelimited").inc()
+
+                raise StageError("Rate limited by twitter, Dropping the banner.") from error
+            except (tweepy.TweepyException, requests.RequestException) as error:
+                attempts += 1
+                TWITTER_UPLOADS.labels(result="failed").inc()
+
+                # Anything but a server or network error, such as invalid credentials, won't be fixed by retrying.
+                if not is_transient_error(error):
+                    raise StageError(f"Failed to upload the banner: {error}") from error
+
+                if attempts >= self.upload_retry_policy.attempts:
+                    raise StageError(f"Failed to upload the banner after {attempts} attempts: {error}") from error
+
+                delay = self.upload_retry_policy.delay(attempts - 1)
+                logger.warning(f"[{state.account.name}] Failed to upload the banner, Retrying in {delay:.0f} seconds: {error}")
+
+                if self.stopped.wait(delay):
+                    raise StageError("Failed to upload the banner before stopping.") from error
+
+                if self.pipeline.is_stale(job):
+                    raise StageError("Failed to upload the banner, Dropping it for the newer one.") from error
+
+        logger.info(f"[{state.account.name}] Updated twitter banner")
+        TWITTER_UPLOADS.labels(result="uploaded").inc()
+
+        if state.fingerprints is not None:
+            state.fingerprints.save(job.fingerprint)
+
+        self._discard(job)
+
+    def _discard(self, job: BannerJob) -> None:
+        """Forget the banner of the job as queued, once it's uploaded, dropped or failed."""
+        state = self.states_by_name[job.account]
+
+        with state.lock:
+            if state.pending_fingerprint == job.fingerprint:
+                state.pending_fingerprint = None
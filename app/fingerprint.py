@@ -0,0 +1,63 @@
+import hashlib
+import json
+import os
+from typing import Optional
+
+from loguru import logger
+
+from .image.generate import get_progress, get_top_tracks
+from .models.song import Song
+
+
+def compute_fingerprint(status: str, song: Song, top_tracks: list) -> str:
+    """Compute a hash of everything that ends up drawn on the banner."""
+    state = {
+        "status": status,
+        "song": [song.name, song.artist, song.album, song.is_explicit, song.is_now_playing, song.image_url],
+        "top_tracks": get_top_tracks(top_tracks),
+        "progress": None,
+    }
+
+    # Only the drawn progress matters, bucket it to the shown time and the progress bar pixel.
+    progress = get_progress(song)
+
+    if progress is not None:
+        current_progress, total_progress, progress_bar_width = progress
+        state["progress"] = [current_progress, total_progress, int(progress_bar_width)]
+
+    return hashlib.sha256(json.dumps(state, sort_keys=True).encode()).hexdigest()
+
+
+class FingerprintStore:
+    """Persisted fingerprint of the last published banner, to skip republishing an unchanged one."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+        self.last = self._load()
+
+    def _load(self) -> Optional[str]:
+        try:
+            with open(self.path) as file:
+                return file.read().strip() or None
+        except OSError:
+            return None
+
+    def matches(self, fingerprint: str) -> bool:
+        """Check if the fingerprint is the same as the last published one."""
+        return self.last == fingerprint
+
+    def save(self, fingerprint: str) -> None:
+        """Store the fingerprint of the published banner, replacing the file atomically."""
+        self.last = fingerprint
+
+        tmp_path = f"{self.path}.tmp"
+
+        # Keep the fingerprint in memory only, on a read-only file system.
+        try:
+            with open(tmp_path, "w") as file:
+                file.write(fingerprint)
+
+            os.replace(tmp_path, self.path)
+        except OSError as error:
+            logger.warning(f"Failed to persist the banner fingerprint: {error}")
@@ -0,0 +1,113 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional, TYPE_CHECKING
+
+from loguru import logger
+
+if TYPE_CHECKING:
+    from .api.spotify import Spotify
+
+
+def _played_at_ms(played_at: str) -> int:
+    """Convert the ISO 8601 `played_at` of a play to a unix timestamp in milliseconds, as used by the cursors."""
+    return int(datetime.fromisoformat(played_at.replace("Z", "+00:00")).timestamp() * 1000)
+
+
+class ListeningHistory:
+    """Local index of the recently played tracks, stored in SQLite.
+
+    Only the plays after the latest stored one are fetched, using the `after` cursor of the recently played
+    route, and the plays are deduplicated by their `played_at` time. Plays beyond `max_plays` are pruned.
+    """
+
+    # Maximum plays returned by the recently played route.
+    PAGE_SIZE = 50
+
+    def __init__(self, path: str, max_plays: int = 1000) -> None:
+        self.path = path
+        self.max_plays = max_plays
+
+        directory = os.path.dirname(path)
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # The connection is shared by the worker threads, one at a time.
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+
+        with self.lock, self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS plays (played_at TEXT PRIMARY KEY, played_at_ms INTEGER NOT NULL, track TEXT NOT NULL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS plays_played_at_ms ON plays (played_at_ms)")
+
+    @property
+    def cursor(self) -> Optional[int]:
+        """Get the time (unix milliseconds) of the latest stored play."""
+        with self.lock:
+            return self.connection.execute("SELECT MAX(played_at_ms) FROM plays").fetchone()[0]
+
+    def add(self, items: list) -> int:
+        """Store the plays of a recently played page, returning how many of them are new."""
+        rows = [(item["played_at"], _played_at_ms(item["played_at"]), json.dumps(item["track"])) for item in items]
+
+        with self.lock, self.connection:
+            before = self.connection.total_changes
+            self.connection.executemany("INSERT OR IGNORE INTO plays VALUES (?, ?, ?)", rows)
+            added = self.connection.total_changes - before
+
+            # Keep only the latest plays.
+            self.connection.execute(
+                "DELETE FROM plays WHERE played_at NOT IN (SELECT played_at FROM plays ORDER BY played_at_ms DESC LIMIT ?)",
+                (self.max_plays,)
+            )
+
+        return added
+
+    def sync(self, spotify: "Spotify") -> int:
+        """Fetch the plays after the latest stored one, returning how many were added."""
+        cursor = self.cursor
+        recently_played = spotify.recently_played(limit=self.PAGE_SIZE, after=str(cursor) if cursor is not None else None)
+
+        added = self.add(recently_played["items"] if recently_played else [])
+        logger.debug(f"Added {added} plays to the listening history.")
+
+        return added
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM plays").fetchone()[0]
+
+    def last_track(self) -> Optional[Dict[str, Any]]:
+        """Get the last played track."""
+        with self.lock:
+            row = self.connection.execute("SELECT track FROM plays ORDER BY played_at_ms DESC LIMIT 1").fetchone()
+
+        return json.loads(row[0]) if row else None
+
+    def random_track(self, recent: int = 20) -> Optional[Dict[str, Any]]:
+        """Get a random track out of the latest plays."""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT track FROM plays ORDER BY played_at_ms DESC LIMIT ?", (recent,)
+            ).fetchall()
+
+        return json.loads(random.choice(rows)[0]) if rows else None
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+
+
+def open_history(path: str, max_plays: int = 1000) -> Optional[ListeningHistory]:
+    """Open the listening history, or continue without it if it can't be stored, such as on a read-only disk."""
+    try:
+        return ListeningHistory(path, max_plays)
+    except (OSError, sqlite3.Error) as error:
+        logger.warning(f"Failed to open the listening history at {path}, Continuing without it: {error}")
+        return None
@@ -0,0 +1,251 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import Optional, Tuple
+
+import requests
+from PIL import Image
+from loguru import logger
+
+from ..config import Config
+from ..metrics import ART_CACHE_REQUESTS, ART_DOWNLOAD_SECONDS
+
+# Size of the album art drawn on the banner.
+ART_SIZE = (350, 350)
+
+
+class ArtCache:
+    """Album art cache keyed by the image URL.
+
+    Keeps the decoded, thumbnailed art in an in-process LRU and the encoded art in a size-capped directory
+    on disk, so replaying an album neither hits the CDN nor decodes and resizes the art again.
+    """
+
+    def __init__(self, cache_dir: str, memory_size: int, disk_size: int, session: Optional[requests.Session] = None) -> None:
+        self.cache_dir = cache_dir
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+
+        # Session used to download the art, replaced with the shared pool by the app.
+        self.session = session or requests.Session()
+        self.timeout = (Config.HTTP_CONNECT_TIMEOUT, Config.HTTP_READ_TIMEOUT)
+
+        self.memory: "OrderedDict[str, Image.Image]" = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+
+        # Size of the files in the disk cache, oldest used first.
+        self.disk_entries: "OrderedDict[str, int]" = OrderedDict()
+        self._scan_disk()
+
+    def _get_memory(self, url: str) -> Optional[Image.Image]:
+        with self.lock:
+            image = self.memory.get(url)
+
+            if image is not None:
+                self.memory.move_to_end(url)
+                self.stats["memory_hits"] += 1
+                ART_CACHE_REQUESTS.labels(tier="memory").inc()
+
+            return image
+
+    def _fetch(self, url: str) -> Tuple[Optional[Image.Image], bytes]:
+        """Get the encoded art from the disk, or download it. The decoded art is returned only if downloaded."""
+        data = self._read_disk(url)
+
+        if data is not None:
+            self.stats["disk_hits"] += 1
+            ART_CACHE_REQUESTS.labels(tier="disk").inc()
+            return None, data
+
+        self.stats["misses"] += 1
+        ART_CACHE_REQUESTS.labels(tier="download").inc()
+        logger.debug(f"Album art cache miss, Downloading {url}")
+
+        with ART_DOWNLOAD_SECONDS.time():
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+
+        image, data = self._thumbnail(response.content)
+        self._write_disk(url, data)
+
+        return image, data
+
+    def get(self, url: str) -> Image.Image:
+        """Get the thumbnailed album art for the URL. The returned image is shared, and must not be modified."""
+        image = self._get_memory(url)
+
+        if image is None:
+            image, data = self._fetch(url)
+
+            if image is None:
+                image = self._decode(data)
+
+            self._remember(url, image)
+
+        return image
+
+    def get_encoded(self, url: str) -> bytes:
+        """Get the encoded, thumbnailed album art for the URL, to pass it to another process."""
+        image, data = self._fetch(url)
+
+        if image is not None:
+            self._remember(url, image)
+
+        return data
+
+    def load(self, url: str, data: bytes) -> Image.Image:
+        """Get the album art for the URL, decoding the encoded art from `get_encoded` if it isn't in memory."""
+        image = self._get_memory(url)
+
+        if image is None:
+            image = self._decode(data)
+            self._remember(url, image)
+
+        return image
+
+    def clear(self, disk: bool = False) -> None:
+        """Drop the cached art from memory, and optionally from the disk."""
+        with self.lock:
+            self.memory.clear()
+
+            if disk:
+                for name in self.disk_entries:
+                    try:
+                        os.remove(os.path.join(self.cache_dir, name))
+                    except OSError:
+                        pass
+
+                self.disk_entries.clear()
+
+    # Memory tier
+    def _remember(self, url: str, image: Image.Image) -> None:
+        with self.lock:
+            self.memory[url] = image
+            self.memory.move_to_end(url)
+
+            while len(self.memory) > self.memory_size:
+                self.memory.popitem(last=False)
+                self.stats["memory_evictions"] += 1
+
+    # Disk tier
+    def _path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode()).hexdigest())
+
+    def _scan_disk(self) -> None:
+        if not os.path.isdir(self.cache_dir):
+            return
+
+        entries = []
+
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".tmp"):
+                continue
+
+            stat = os.stat(os.path.join(self.cache_dir, name))
+            entries.append((stat.st_mtime, name, stat.st_size))
+
+        for _, name, size in sorted(entries):
+            self.disk_entries[name] = size
+
+    def _read_disk(self, url: str) -> Optional[bytes]:
+        path = self._path(url)
+
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except OSError:
+            return None
+
+        # Mark as recently used, for the eviction order.
+        os.utime(path)
+
+        with self.lock:
+            name = os.path.basename(path)
+
+            if name in self.disk_entries:
+                self.disk_entries.move_to_end(name)
+
+        return data
+
+    def _write_disk(self, url: str, data: bytes) -> None:
+        path = self._path(url)
+
+        # The same art may be downloaded by concurrent cycles, give each its own temporary file.
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+            with open(tmp_path, "wb") as file:
+                file.write(data)
+
+            os.replace(tmp_path, path)
+        except OSError as error:
+            logger.warning(f"Failed to store album art on disk: {error}")
+            return
+
+        with self.lock:
+            self.disk_entries[os.path.basename(path)] = len(data)
+            self.disk_entries.move_to_end(os.path.basename(path))
+
+            self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        total_size = sum(self.disk_entries.values())
+
+        while total_size > self.disk_size and len(self.disk_entries) > 1:
+            name, size = self.disk_entries.popitem(last=False)
+            total_size -= size
+
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+
+            self.stats["disk_evictions"] += 1
+
+    # Utility methods
+    @staticmethod
+    def _decode(data: bytes) -> Image.Image:
+        image = Image.open(BytesIO(data))
+        image.load()
+
+        return image
+
+    @staticmethod
+    def _thumbnail(data: bytes) -> Tuple[Image.Image, bytes]:
+        """Thumbnail the downloaded art, returning the image and the bytes to store on disk."""
+        image = Image.open(BytesIO(data))
+        size = image.size
+
+        image.thumbnail(ART_SIZE, Image.ANTIALIAS)
+        image.load()
+
+        # Keep the original encoding if the art already fits, otherwise store the resized art losslessly.
+        if image.size == size:
+            return image, data
+
+        buffer = BytesIO()
+        image.save(buffer, format="PNG")
+
+        return image, buffer.getvalue()
+
+    @property
+    def hit_rate(self) -> float:
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+
+        return hits / total if total else 0.0
+
+
+art_cache = ArtCache(Config.ART_CACHE_DIR, Config.ART_CACHE_MEMORY_SIZE, Config.ART_CACHE_DISK_SIZE)
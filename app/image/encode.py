@@ -0,0 +1,147 @@
+import math
+from dataclasses import dataclass
+from io import BytesIO
+from typing import List, Optional, Tuple, cast
+
+from PIL import Image, ImageChops, ImageStat
+
+from ..config import Config
+
+
+@dataclass
+class EncoderProfile:
+    # Largest encoded size to aim for (in bytes), and the lowest PSNR (in dB) accepted to get there.
+    target_size: Optional[int] = None
+    min_psnr: Optional[float] = None
+
+    # Range of the JPEG quality to search.
+    min_quality: int = 60
+    max_quality: int = 100
+
+    # Chroma subsampling to try, 0 is 4:4:4, 1 is 4:2:2 and 2 is 4:2:0.
+    subsamplings: Tuple[int, ...] = (2, 0)
+
+
+@dataclass
+class EncodedImage:
+    data: bytes
+    quality: int
+    subsampling: int
+    psnr: float
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+
+def psnr(original: Image.Image, encoded: Image.Image) -> float:
+    """Calculate the peak signal to noise ratio of the encoded image, the higher the closer to the original."""
+    with ImageChops.difference(original, encoded) as difference:
+        stat = ImageStat.Stat(difference)
+
+    mse = sum(rms ** 2 for rms in stat.rms) / len(stat.rms)
+
+    return math.inf if mse == 0 else 20 * math.log10(255 / math.sqrt(mse))
+
+
+def _decoded_psnr(img: Image.Image, data: bytes) -> float:
+    """Decode the encoded image to measure its PSNR, closing the decoded images right away."""
+    with Image.open(BytesIO(data)) as decoded, decoded.convert(img.mode) as converted:
+        return psnr(img, converted)
+
+
+def _encode(img: Image.Image, quality: int, subsampling: int, measure: bool = False) -> EncodedImage:
+    buffer = BytesIO()
+    img.save(buffer, format="JPEG", quality=quality, subsampling=subsampling)
+
+    data = buffer.getvalue()
+    encoded_psnr = _decoded_psnr(img, data) if measure else math.nan
+
+    return EncodedImage(data, quality, subsampling, encoded_psnr)
+
+
+def _search_target_size(img: Image.Image, profile: EncoderProfile, subsampling: int) -> Optional[EncodedImage]:
+    """Binary search the highest quality with the encoded size within the target size."""
+    target_size = cast(int, profile.target_size)
+    low, high = profile.min_quality, profile.max_quality
+
+    best = None
+
+    while low <= high:
+        quality = (low + high) // 2
+        encoded = _encode(img, quality, subsampling)
+
+        if encoded.size <= target_size:
+            best = encoded
+            low = quality + 1
+        else:
+            high = quality - 1
+
+    return best
+
+
+def _search_min_psnr(img: Image.Image, profile: EncoderProfile, subsampling: int) -> Optional[EncodedImage]:
+    """Binary search the lowest quality with the PSNR above the floor."""
+    min_psnr = cast(float, profile.min_psnr)
+    low, high = profile.min_quality, profile.max_quality
+
+    best = None
+
+    while low <= high:
+        quality = (low + high) // 2
+        encoded = _encode(img, quality, subsampling, measure=True)
+
+        if encoded.psnr >= min_psnr:
+            best = encoded
+            high = quality - 1
+        else:
+            low = quality + 1
+
+    return best
+
+
+def encode_jpeg(img: Image.Image, profile: Optional[EncoderProfile] = None) -> EncodedImage:
+    """Encode the image as a JPEG, searching the quality and chroma subsampling to fit the profile."""
+    if profile is None:
+        profile = EncoderProfile()
+
+    # Nothing to aim for, encode with the highest quality.
+    if profile.target_size is None and profile.min_psnr is None:
+        return _encode(img, profile.max_quality, profile.subsamplings[0])
+
+    candidates: List[EncodedImage] = []
+
+    for subsampling in profile.subsamplings:
+        if profile.target_size is not None:
+            encoded = _search_target_size(img, profile, subsampling)
+
+            # Measure the fitting encoding, to pick the subsampling closest to the original.
+            if encoded is not None:
+                encoded.psnr = _decoded_psnr(img, encoded.data)
+        else:
+            encoded = _search_min_psnr(img, profile, subsampling)
+
+        if encoded is not None and (profile.min_psnr is None or encoded.psnr >= profile.min_psnr):
+            candidates.append(encoded)
+
+    if not candidates:
+        # Nothing meets the profile, fall back to the smallest encoding allowed.
+        return min(
+            (_encode(img, profile.min_quality, subsampling) for subsampling in profile.subsamplings),
+            key=lambda encoded: encoded.size,
+        )
+
+    # Prefer the closest to the original within the target size, otherwise the smallest above the PSNR floor.
+    if profile.target_size is not None:
+        return max(candidates, key=lambda encoded: encoded.psnr)
+
+    return min(candidates, key=lambda encoded: encoded.size)
+
+
+# Profile for encoding the banner, from the configuration.
+banner_profile = EncoderProfile(
+    target_size=Config.JPEG_TARGET_SIZE or None,
+    min_psnr=Config.JPEG_MIN_PSNR or None,
+    min_quality=Config.JPEG_MIN_QUALITY,
+    max_quality=Config.JPEG_MAX_QUALITY,
+)
@@ -0,0 +1,79 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+
+from PIL import ImageFont
+
+
+@dataclass
+class FontLoad:
+    path: str
+    size: int
+
+    # Time taken to load the font (in seconds).
+    load_time: float
+
+    # Size of the font file, and the growth of resident memory while loading it (in bytes).
+    file_size: int
+    memory: int
+
+
+def resident_memory() -> int:
+    """Get the resident memory of the process in bytes, where the platform exposes it."""
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+class FontRegistry:
+    """Registry of loaded fonts keyed by the path and size, so that each face is parsed only once."""
+
+    def __init__(self) -> None:
+        self.fonts: Dict[Tuple[str, int], ImageFont.FreeTypeFont] = {}
+        self.loads: List[FontLoad] = []
+
+        self.lock = threading.Lock()
+
+    def get(self, path: str, size: int) -> ImageFont.FreeTypeFont:
+        """Get the font for the path and size, loading it on the first use."""
+        font = self.fonts.get((path, size))
+
+        if font is not None:
+            return font
+
+        with self.lock:
+            # Check again, in case another thread loaded it while waiting for the lock.
+            if (path, size) not in self.fonts:
+                self.fonts[(path, size)] = self._load(path, size)
+
+            return self.fonts[(path, size)]
+
+    def preload(self, fonts: Iterable[Tuple[str, int]]) -> List[FontLoad]:
+        """Load the fonts ahead of time, returning the time and memory taken by each of the loaded fonts."""
+        for path, size in fonts:
+            self.get(path, size)
+
+        return self.loads
+
+    def _load(self, path: str, size: int) -> ImageFont.FreeTypeFont:
+        memory = resident_memory()
+        start = time.perf_counter()
+
+        font = ImageFont.truetype(path, size=size)
+
+        self.loads.append(FontLoad(
+            path,
+            size,
+            time.perf_counter() - start,
+            os.path.getsize(path),
+            max(resident_memory() - memory, 0),
+        ))
+
+        return font
+
+
+fonts = FontRegistry()
@@ -1,34 +1,234 @@
-from typing import cast
+import time
+from functools import reduce
+from io import BytesIO
+from typing import Any, List, Optional, Tuple, cast
 
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageChops
 
-from ..config import Fonts
+from .encode import EncoderProfile, banner_profile, encode_jpeg
+from .layout import Layout, compile_layout, draw_ops
+from ..config import Config
+from ..metrics import BANNER_ENCODE_SECONDS, BANNER_RENDER_SECONDS
 from ..models.song import Song
 
 
-def truncate_text(text: str, font: ImageFont.FreeTypeFont, max_width: int) -> str:
-    if font.getsize(text)[0] <= max_width:
-        return text.strip()
+def get_top_tracks(top_tracks: list, layout: Optional[Layout] = None) -> List[dict]:
+    """Get the name and artist of the top tracks, truncated the way they are drawn on the banner."""
+    fits = (layout or banner_layout).top_track_fits
 
-    while font.getsize(text)[0] > max_width:
-        text = text[:-1]
+    def fit(field: str, text: str) -> str:
+        return fits[field].fit(text) if field in fits else text
 
-    return text.strip() + ".."
+    return [
+        {
+            "name": fit("name", track["name"].replace("&", "&amp;")),
+            "artist": fit("artist", track["artists"][0]["name"].replace("&", "&amp;")),
+        }
+        for track in top_tracks
+    ]
+
+
+def get_progress(song: Song, layout: Optional[Layout] = None) -> Optional[Tuple[str, str, float]]:
+    """Get the current time, total time and progress bar width drawn for the song, if listening currently."""
+    if not song.is_now_playing:
+        return None
+
+    total_time = cast(int, song.duration_ms)
+    current_time = cast(int, song.progress_ms)
+
+    # Calculate the progress bar width.
+    progress_bar_width = (current_time / total_time) * (layout or banner_layout).progress_width
+
+    current_progress = f"{current_time // 60000}:{current_time // 1000 % 60:02d}"
+    total_progress = f"{total_time // 60000}:{total_time // 1000 % 60:02d}"
+
+    return current_progress, total_progress, progress_bar_width
+
+
+# Layout of the banner, compiled from the template once.
+banner_layout = compile_layout(Config.LAYOUT_PATH)
+
+# Regions of the banner holding the song, and the top tracks. They don't overlap with each other or with the
+# divider and title, which are drawn on the base layer.
+TRACK_BOX = banner_layout.song_box
+TOP_TRACKS_BOX = banner_layout.top_tracks_box
+
+# Region redrawn when only the progress changes, covering the progress bar and the times below it.
+PROGRESS_BOX = banner_layout.progress_box
+
+
+class BannerRenderer:
+    """Render the banner from layers, each cached on the inputs it depends on.
+
+    The base layer never changes, the top tracks layer changes with the top tracks, and the song layer changes
+    with the status and the song. They are composited once per change, and the last frame is kept, so an update
+    of only the progress restores and redraws just the progress region of the frame. Each layer is drawn by
+    replaying the draw operations of the compiled layout.
+    """
+
+    def __init__(self, layout: Optional[Layout] = None) -> None:
+        self.layout = layout or banner_layout
+        self.base: Optional[Image.Image] = None
+
+        # Cached layers, and the inputs they were drawn from.
+        self.top_tracks_layer: Optional[Tuple[Any, Image.Image]] = None
+        self.song_layer: Optional[Tuple[Any, Image.Image]] = None
+        self.composite: Optional[Tuple[Any, Image.Image]] = None
+
+        # Last rendered frame with the key of its composite, and the region redrawn for it (None if fully drawn).
+        self.frame: Optional[Tuple[Any, Image.Image]] = None
+        self.damage: Optional[Tuple[int, int, int, int]] = None
+
+    def _new_layer(self, cached: Optional[Tuple[Any, Image.Image]], box: Tuple[int, int, int, int]) -> Image.Image:
+        """Clear the canvas of the cached layer to redraw it, instead of allocating a new one."""
+        if cached is None:
+            return Image.new("RGB", (box[2] - box[0], box[3] - box[1]), self.layout.background)
+
+        layer = cached[1]
+        layer.paste(self.layout.background, (0, 0) + layer.size)
+
+        return layer
+
+    def _get_base(self) -> Image.Image:
+        if self.base is None:
+            self.base = Image.new("RGB", self.layout.size, self.layout.background)
+            draw_ops(self.base, self.layout.base_ops, {})
+
+        return self.base
+
+    def _get_top_tracks_layer(self, top_tracks: List[dict]) -> Tuple[Any, Image.Image]:
+        key = tuple((track["name"], track["artist"]) for track in top_tracks)
+
+        if self.top_tracks_layer is None or self.top_tracks_layer[0] != key:
+            layer = self._new_layer(self.top_tracks_layer, self.layout.top_tracks_box)
+
+            # Forget the cleared layer until it's redrawn, in case drawing fails.
+            self.top_tracks_layer = None
+
+            values = {f"{row}.{field}": value for row, track in enumerate(top_tracks) for field, value in track.items()}
+            draw_ops(layer, self.layout.top_tracks_ops, values)
+
+            self.top_tracks_layer = (key, layer)
+
+        return self.top_tracks_layer
+
+    def _get_song_layer(self, status: str, song: Song) -> Tuple[Any, Image.Image]:
+        key = (status, song.name, song.artist, song.album, song.is_explicit, song.image_url)
+
+        if self.song_layer is None or self.song_layer[0] != key:
+            layer = self._new_layer(self.song_layer, self.layout.song_box)
+
+            self.song_layer = None
+            draw_ops(layer, self.layout.song_ops, {
+                "status": status,
+                "name": song.name,
+                "artist": song.artist,
+                "album": song.album,
+                "is_explicit": song.is_explicit,
+                # The art cache has already thumbnailed the album art.
+                "art": song.image,
+            })
 
+            self.song_layer = (key, layer)
 
-def midpoint(start: int, end: int, text: str, font: ImageFont.FreeTypeFont) -> float:
-    """Calculate the midpoint between two points with the text width of the font."""
-    mid = (start + end) / 2
+        return self.song_layer
 
-    text_width = font.getsize(text)[0]
+    def _get_composite(self, status: str, song: Song, top_tracks: List[dict]) -> Tuple[Any, Image.Image]:
+        top_tracks_key, top_tracks_layer = self._get_top_tracks_layer(top_tracks)
+        song_key, song_layer = self._get_song_layer(status, song)
 
-    return mid - (text_width / 2)
+        key = (top_tracks_key, song_key)
 
+        if self.composite is None or self.composite[0] != key:
+            # Reuse the canvas of the previous composite.
+            if self.composite is None:
+                composite = self._get_base().copy()
+            else:
+                composite = self.composite[1]
+                composite.paste(self._get_base())
 
-def draw_tag(draw: ImageDraw.ImageDraw, x: int, y: int, text: str, font: ImageFont.FreeTypeFont, color: tuple) -> None:
-    """Draw a tag with black text and specified color as background."""
-    draw.rectangle((x, y, x + font.getsize(text)[0] + 10, y + font.getsize(text)[1] + 10), fill=color)
-    draw.text((x + 5, y + 5), text, font=font, fill=(0, 0, 0))
+            composite.paste(top_tracks_layer, self.layout.top_tracks_box[:2])
+            composite.paste(song_layer, self.layout.song_box[:2])
+
+            self.composite = (key, composite)
+
+        return self.composite
+
+    def render_frame(self, status: str, song: Song, top_tracks: list) -> Image.Image:
+        """Render the banner into the kept frame, which is shared and changes on the next render."""
+        start = time.perf_counter()
+        key, composite = self._get_composite(status, song, get_top_tracks(top_tracks, self.layout))
+        progress_box = self.layout.progress_box
+
+        if self.frame is None:
+            img = composite.copy()
+            self.damage = None
+        elif self.frame[0] != key:
+            # Redraw the whole frame, on the canvas of the last frame.
+            img = self.frame[1]
+            img.paste(composite)
+            self.damage = None
+        else:
+            # Only the progress changed, restore the region under it from the composite.
+            img = self.frame[1]
+
+            with composite.crop(progress_box) as background:
+                img.paste(background, progress_box[:2])
+
+            self.damage = progress_box
+
+        # Add song progress bar, if listening currently.
+        progress = get_progress(song, self.layout)
+
+        if progress is not None:
+            current_progress, total_progress, progress_bar_width = progress
+            draw_ops(img, self.layout.progress_ops, {"current": current_progress, "total": total_progress, "bar_width": progress_bar_width})
+
+        self.frame = (key, img)
+
+        region = "full" if self.damage is None else "progress"
+        BANNER_RENDER_SECONDS.labels(region=region).observe(time.perf_counter() - start)
+
+        return img
+
+    def render(self, status: str, song: Song, top_tracks: list) -> Image.Image:
+        """Render the banner, returning a new image which the caller owns."""
+        return self.render_frame(status, song, top_tracks).copy()
+
+    @property
+    def frame_key(self) -> Any:
+        """Get the key of the composite under the last frame, frames with the same key only differ in progress."""
+        return self.frame[0] if self.frame is not None else None
+
+
+renderer = BannerRenderer()
+
+
+def visual_change(previous: Image.Image, current: Image.Image, box: Optional[Tuple[int, int, int, int]] = None,
+                  tolerance: int = 16) -> float:
+    """Get the fraction of the banner pixels in the box differing by more than the tolerance between the images."""
+    assert previous.size == current.size, f"Can't compare a {previous.size} banner with a {current.size} one."
+    width, height = previous.size
+
+    if box is not None:
+        previous, current = previous.crop(box), current.crop(box)
+
+    # Largest difference of the channels of every pixel, thresholded to 0 or 255.
+    difference = ImageChops.difference(previous, current)
+    changed = reduce(ImageChops.lighter, difference.split()).point(lambda value: 255 if value > tolerance else 0)
+
+    return changed.histogram()[255] / (width * height)
+
+
+def encode_banner(img: Image.Image, profile: Optional[EncoderProfile] = None) -> BytesIO:
+    """Encode the rendered banner in memory."""
+    with BANNER_ENCODE_SECONDS.time():
+        return BytesIO(encode_jpeg(img, profile or banner_profile).data)
+
+
+def render_banner(status: str, song: Song, top_tracks: list, profile: Optional[EncoderProfile] = None) -> BytesIO:
+    """Render and encode the banner in memory."""
+    return encode_banner(renderer.render_frame(status, song, top_tracks), profile)
 
 
 def generate_image(
@@ -38,164 +238,12 @@ def generate_image(
     image_save_path: str,
     show_only: bool = False
 ) -> None:
-    # Get the top tracks filtered by grabbing the name, and artist.
-    top_tracks = [
-        {
-            "name": track["name"].replace("&", "&amp;"),
-            "artist": track["artists"][0]["name"].replace("&", "&amp;"),
-        }
-        for track in top_tracks
-    ]
-
-    # Create an image.
-    img = Image.new("RGB", (1500, 500), (10, 14, 18))
-    draw = ImageDraw.Draw(img)
-
-    # Load fonts
-    fira_code = ImageFont.truetype(Fonts.FIRA_REGULAR, size=23)
-    fira_code_small = ImageFont.truetype(Fonts.FIRA_REGULAR, size=18)
-    poppins = ImageFont.truetype(Fonts.POPPINS_REGULAR, size=27)
-    poppins_semibold = ImageFont.truetype(Fonts.POPPINS_SEMIBOLD, size=27)
-
-    # Add the song image to the image.
-    song.image.thumbnail((350, 350), Image.ANTIALIAS)
-    img.paste(song.image, (50, 100))
-
-    # Add the status text above the image, aligned in the center, using midpoint from coordinates of 50 to 400.
-    draw.text(
-        (50, 50),
-        status,
-        (255, 255, 255),
-        font=poppins,
-    )
-
-    # Add the song name, artist name, and album name in the right side of the image.
-    white = "#ffffff"
-
-    draw.text(
-        (400, 150),
-        truncate_text(song.name, poppins, 600),
-        fill=white,
-        font=poppins_semibold,
-    )
-
-    draw.text(
-        (400, 200),
-        truncate_text(song.artist, poppins, 600),
-        fill=white,
-        font=poppins,
-    )
-
-    draw.text(
-        (400, 250),
-        truncate_text(song.album, poppins, 600),
-        fill=white,
-        font=poppins,
-    )
-
-    # Add explicit tag.
-    if song.is_explicit:
-        draw_tag(draw, 400, 300, "EXPLICIT", fira_code_small, (255, 255, 255))
-
-    # Add a white line in left of top tracks, to separate it.
-    draw.line(
-        (
-            img.size[0] - 375,
-            100,
-            img.size[0] - 375,
-            400,
-        ),
-        fill=white
-    )
-
-    # Assign top songs name and artists font.
-    top_tracks = [
-        {
-            "name": truncate_text(track["name"], poppins, 300),
-            "artist": truncate_text(track["artist"], fira_code, 300),
-        }
-        for track in top_tracks
-    ]
-
-    # Add title containing top tracks on top before displaying the top tracks.
-    draw.text(
-        (img.size[0] - 350, 50),
-        "Top Tracks:",
-        fill=white,
-        font=poppins_semibold,
-    )
-
-    # Add the top songs to the right side of the image.
-    for i, track in enumerate(top_tracks):
-        # Add the song name.
-        draw.text(
-            (
-                img.size[0] - 350,
-                100 + (i * 50) + (i * 10),
-            ),
-            track["name"],
-            font=poppins,
-            fill=(255, 255, 255),
-        )
-
-        # Add the artist name.
-        draw.text(
-            (
-                img.size[0] - 350,
-                100 + (i * 50) + (i * 10) + 35,
-            ),
-            track["artist"],
-            font=fira_code_small,
-            fill=(255, 255, 255),
-        )
-
-    # Add song progress bar, if listening currently.
-    if song.is_now_playing:
-        total_time = cast(int, song.duration_ms)
-        current_time = cast(int, song.progress_ms)
-
-        # Calculate the progress bar width.
-        progress_bar_width = (current_time / total_time) * 700
-
-        # Draw the progress bar. White for the covered progress, Gray for the left progress.
-        # Draw from right of the image till the top tracks.
-        draw.rectangle(
-            ((375, 425), (1100, 430)),
-            fill="#B3B3B3"
-        )
-        draw.rectangle(
-            ((375 + progress_bar_width, 425), (1100, 430)), fill="#404040"
-        )
-
-        # Add the time progress text, in the center of the progress bar. Display current time and total time.
-        current_progress = f"{current_time // 60000}:{current_time // 1000 % 60:02d}"
-        total_progress = f"{total_time // 60000}:{total_time // 1000 % 60:02d}"
-
-        # Display current progress in the progress bar start.
-        draw.text(
-            (
-                375,
-                440,
-            ),
-            current_progress,
-            font=poppins,
-            fill=(255, 255, 255),
-        )
-
-        # Display total progress in the progress bar end.
-        draw.text(
-            (
-                1100 - (len(total_progress) * 10),
-                440,
-            ),
-            total_progress,
-            font=poppins,
-            fill=(255, 255, 255),
-        )
+    img = renderer.render(status, song, top_tracks)
 
     # Show the image, if show only is enabled.
     if show_only:
         img.show()
     else:
         # Save the image to the path specified.
-        img.save(image_save_path, format="JPEG", quality=100)
+        with open(image_save_path, "wb") as file:
+            file.write(encode_jpeg(img, banner_profile).data)
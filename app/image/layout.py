@@ -0,0 +1,285 @@
+import json
+import os
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+
+from .fonts import fonts
+from .text import text_size, truncate_text
+from ..config import Fonts
+
+Box = Tuple[int, int, int, int]
+Color = Tuple[int, ...]
+
+# Fields of the top tracks, which the rows of the top tracks draw.
+TOP_TRACK_FIELDS = ("name", "artist")
+
+
+@dataclass
+class TextFit:
+    """Truncation of a text to a width, measured with a font which may differ from the one drawing the text."""
+    font: ImageFont.FreeTypeFont
+    max_width: int
+
+    def fit(self, text: str) -> str:
+        return truncate_text(text, self.font, self.max_width)
+
+
+class DrawOp(ABC):
+    """Step drawing a layer, with everything but the values of the cycle resolved when compiling the layout."""
+
+    @abstractmethod
+    def draw(self, img: Image.Image, draw: ImageDraw.ImageDraw, values: Mapping[str, Any]) -> None:
+        ...
+
+
+@dataclass
+class TextOp(DrawOp):
+    position: Tuple[int, int]
+    font: ImageFont.FreeTypeFont
+    color: Color
+
+    # Static text, or the field of the values drawn.
+    text: Optional[str] = None
+    field: Optional[str] = None
+
+    fit: Optional[TextFit] = None
+
+    # Pixels to shift the text left by per character, to end it around the position.
+    shift_per_char: int = 0
+
+    def draw(self, img: Image.Image, draw: ImageDraw.ImageDraw, values: Mapping[str, Any]) -> None:
+        text = self.text if self.field is None else values.get(self.field)
+
+        if text is None:
+            return
+
+        if self.fit is not None:
+            text = self.fit.fit(text)
+
+        position = (self.position[0] - len(text) * self.shift_per_char, self.position[1])
+        draw.text(position, text, fill=self.color, font=self.font)
+
+
+@dataclass
+class LineOp(DrawOp):
+    points: Box
+    color: Color
+
+    def draw(self, img: Image.Image, draw: ImageDraw.ImageDraw, values: Mapping[str, Any]) -> None:
+        draw.line(self.points, fill=self.color)
+
+
+@dataclass
+class ArtOp(DrawOp):
+    position: Tuple[int, int]
+    field: str
+
+    def draw(self, img: Image.Image, draw: ImageDraw.ImageDraw, values: Mapping[str, Any]) -> None:
+        art = values.get(self.field)
+
+        if art is not None:
+            img.paste(art, self.position)
+
+
+@dataclass
+class TagOp(DrawOp):
+    """Text on a filled box, drawn when the field is set. The box is sized to the text when compiling."""
+    box: Box
+    text_position: Tuple[int, int]
+    text: str
+    font: ImageFont.FreeTypeFont
+    color: Color
+    text_color: Color
+    field: str
+
+    def draw(self, img: Image.Image, draw: ImageDraw.ImageDraw, values: Mapping[str, Any]) -> None:
+        if not values.get(self.field):
+            return
+
+        draw.rectangle(self.box, fill=self.color)
+        draw.text(self.text_position, self.text, font=self.font, fill=self.text_color)
+
+
+@dataclass
+class ProgressBarOp(DrawOp):
+    """Bar covered up to the width in the field from its left edge, and the remaining part after it."""
+    box: Box
+    color: Color
+    remaining_color: Color
+    field: str
+
+    def draw(self, img: Image.Image, draw: ImageDraw.ImageDraw, values: Mapping[str, Any]) -> None:
+        width = values.get(self.field)
+
+        if width is None:
+            return
+
+        draw.rectangle(self.box, fill=self.color)
+        draw.rectangle((self.box[0] + width, self.box[1], self.box[2], self.box[3]), fill=self.remaining_color)
+
+
+@dataclass
+class Layout:
+    """Banner layout compiled from a template, into the draw operations of each layer."""
+    size: Tuple[int, int]
+    background: Color
+
+    # Regions of the song and top tracks layers, and the region redrawn when only the progress changes.
+    song_box: Box
+    top_tracks_box: Box
+    progress_box: Box
+
+    # Draw operations of the layers, positioned relative to the layer. The progress is drawn on the banner.
+    base_ops: List[DrawOp]
+    song_ops: List[DrawOp]
+    top_tracks_ops: List[DrawOp]
+    progress_ops: List[DrawOp]
+
+    # Truncation of the top tracks fields, and the width of the progress bar for the whole song.
+    top_track_fits: Dict[str, TextFit]
+    progress_width: float
+
+    # Font files and sizes used by the layout.
+    fonts: List[Tuple[str, int]]
+
+
+def draw_ops(img: Image.Image, ops: List[DrawOp], values: Mapping[str, Any]) -> None:
+    """Replay the draw operations on the image, with the values of the cycle."""
+    draw = ImageDraw.Draw(img)
+
+    for op in ops:
+        op.draw(img, draw, values)
+
+
+class _Compiler:
+    def __init__(self, template: Dict[str, Any]) -> None:
+        self.template = template
+        self.fonts: Dict[str, Tuple[str, int]] = {
+            name: (os.path.join(Fonts.FONT_PATH, file), size) for name, (file, size) in template["fonts"].items()
+        }
+
+    def font(self, name: str) -> ImageFont.FreeTypeFont:
+        if name not in self.fonts:
+            raise Exception(f"Unknown font in the layout: {name}")
+
+        return fonts.get(*self.fonts[name])
+
+    @staticmethod
+    def color(value: str) -> Color:
+        return ImageColor.getrgb(value)
+
+    def fit(self, element: Dict[str, Any]) -> Optional[TextFit]:
+        if "max_width" not in element:
+            return None
+
+        return TextFit(self.font(element.get("measure_font", element["font"])), element["max_width"])
+
+    def compile(self, element: Dict[str, Any], offset: Tuple[int, int], field: Optional[str] = None) -> DrawOp:
+        """Compile the element, moving it by the offset and reading the field if given."""
+        kind = element["type"]
+        dx, dy = offset
+
+        if kind == "text":
+            return TextOp(
+                (element["position"][0] + dx, element["position"][1] + dy),
+                self.font(element["font"]),
+                self.color(element["color"]),
+                text=element.get("text"),
+                field=field or element.get("field"),
+                fit=None if field else self.fit(element),
+                shift_per_char=element.get("shift_per_char", 0),
+            )
+
+        if kind == "line":
+            x1, y1, x2, y2 = element["points"]
+            return LineOp((x1 + dx, y1 + dy, x2 + dx, y2 + dy), self.color(element["color"]))
+
+        if kind == "art":
+            return ArtOp((element["position"][0] + dx, element["position"][1] + dy), element["field"])
+
+        if kind == "tag":
+            font = self.font(element["font"])
+            width, height = text_size(font, element["text"])
+
+            x, y = element["position"][0] + dx, element["position"][1] + dy
+            padding = element["padding"]
+
+            return TagOp(
+                (x, y, x + width + padding * 2, y + height + padding * 2),
+                (x + padding, y + padding),
+                element["text"],
+                font,
+                self.color(element["color"]),
+                self.color(element["text_color"]),
+                element["field"],
+            )
+
+        if kind == "progress_bar":
+            x1, y1, x2, y2 = element["box"]
+
+            return ProgressBarOp(
+                (x1 + dx, y1 + dy, x2 + dx, y2 + dy),
+                self.color(element["color"]),
+                self.color(element["remaining_color"]),
+                element["field"],
+            )
+
+        raise Exception(f"Unknown element in the layout: {kind}")
+
+    def compile_layer(self, layer: Dict[str, Any], origin: Tuple[int, int] = (0, 0)) -> List[DrawOp]:
+        return [self.compile(element, (-origin[0], -origin[1])) for element in layer["elements"]]
+
+    def compile_rows(self, layer: Dict[str, Any], origin: Tuple[int, int]) -> List[DrawOp]:
+        """Repeat the elements of the top tracks for each row, reading the fields of the row."""
+        ops = []
+
+        for row in range(layer["rows"]):
+            offset = (layer["spacing"][0] * row - origin[0], layer["spacing"][1] * row - origin[1])
+
+            for element in layer["elements"]:
+                ops.append(self.compile(element, offset, field=f"{row}.{element['field']}"))
+
+        return ops
+
+    def layout(self) -> Layout:
+        template = self.template
+
+        song, top_tracks, progress = template["song"], template["top_tracks"], template["progress"]
+        top_tracks_box = tuple(top_tracks["box"])
+
+        fits = {}
+
+        for element in top_tracks["elements"]:
+            if element.get("field") not in TOP_TRACK_FIELDS:
+                raise Exception(f"Top tracks can only draw the fields: {', '.join(TOP_TRACK_FIELDS)}")
+
+            fit = self.fit(element)
+
+            if fit is not None:
+                fits[element["field"]] = fit
+
+        return Layout(
+            size=tuple(template["size"]),
+            background=self.color(template["background"]),
+            song_box=tuple(song["box"]),
+            top_tracks_box=top_tracks_box,
+            progress_box=tuple(progress["box"]),
+            base_ops=self.compile_layer(template["base"]),
+            song_ops=self.compile_layer(song, tuple(song["box"][:2])),
+            top_tracks_ops=self.compile_rows(top_tracks, top_tracks_box[:2]),
+            progress_ops=self.compile_layer(progress),
+            top_track_fits=fits,
+            progress_width=progress["width"],
+            fonts=list(self.fonts.values()),
+        )
+
+
+def compile_layout(path: str) -> Layout:
+    """Load the layout template from a JSON file, and compile it into the draw operations of the layers."""
+    with open(path) as file:
+        template = json.load(file)
+
+    return _Compiler(template).layout()
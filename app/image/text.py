@@ -0,0 +1,34 @@
+from functools import lru_cache
+from typing import Tuple
+
+from PIL import ImageFont
+
+
+@lru_cache(maxsize=4096)
+def text_size(font: ImageFont.FreeTypeFont, text: str) -> Tuple[int, int]:
+    """Get the size of the text drawn with the font, cached per font and text."""
+    return font.getsize(text)
+
+
+def text_width(font: ImageFont.FreeTypeFont, text: str) -> int:
+    """Get the width of the text drawn with the font."""
+    return text_size(font, text)[0]
+
+
+def truncate_text(text: str, font: ImageFont.FreeTypeFont, max_width: int) -> str:
+    """Truncate the text to fit within the width, marking the truncated text with `..`."""
+    if text_width(font, text) <= max_width:
+        return text.strip()
+
+    # Binary search for the longest prefix that fits, since the prefix widths only grow with the length.
+    low, high = 0, len(text) - 1
+
+    while low < high:
+        mid = (low + high + 1) // 2
+
+        if text_width(font, text[:mid]) <= max_width:
+            low = mid
+        else:
+            high = mid - 1
+
+    return text[:low].strip() + ".."
@@ -0,0 +1,287 @@
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import ContextManager, Dict, Iterator, List, Optional, Tuple, Union, cast
+
+from loguru import logger
+
+# Upper bounds of the histogram buckets (in seconds).
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Counter:
+    def __init__(self) -> None:
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self.lock:
+            self.value += amount
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+
+        # Observations in each bucket, the last one is for the values above every bound.
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self.lock:
+            index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Observe the seconds spent in the block, also when it raises."""
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def quantile(self, q: float) -> float:
+        """Estimate the quantile as the upper bound of the bucket containing it."""
+        with self.lock:
+            rank = q * self.count
+            cumulative = 0
+
+            for bound, count in zip(self.buckets + (math.inf,), self.counts):
+                cumulative += count
+
+                if cumulative >= rank:
+                    return bound
+
+            return math.inf
+
+
+Metric = Union[Counter, Histogram]
+
+
+class MetricFamily:
+    """Metric declared once by its name and help, with a metric for every combination of the values of its labels."""
+
+    def __init__(self, kind: str, name: str, description: str, label_names: Tuple[str, ...] = ()) -> None:
+        self.kind = kind
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+
+        self.children: Dict[Labels, Metric] = {}
+        self.lock = threading.Lock()
+
+    def _child(self, labels: Dict[str, str]) -> Metric:
+        if set(labels) != set(self.label_names):
+            raise Exception(f"Metric {self.name} has the labels {self.label_names}, got {tuple(labels)}.")
+
+        key = tuple(sorted(labels.items()))
+
+        with self.lock:
+            metric = self.children.get(key)
+
+            if metric is None:
+                metric = self.children[key] = Counter() if self.kind == "counter" else Histogram()
+
+            return metric
+
+    def items(self) -> List[Tuple[Labels, Metric]]:
+        with self.lock:
+            return sorted(self.children.items())
+
+
+class CounterFamily(MetricFamily):
+    def labels(self, **labels: str) -> Counter:
+        return cast(Counter, self._child(labels))
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+
+class HistogramFamily(MetricFamily):
+    def labels(self, **labels: str) -> Histogram:
+        return cast(Histogram, self._child(labels))
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def time(self) -> ContextManager[None]:
+        return self.labels().time()
+
+
+class Metrics:
+    """Registry of the counters and histograms of the app, each declared once by its name."""
+
+    def __init__(self) -> None:
+        self.families: Dict[str, MetricFamily] = {}
+        self.lock = threading.Lock()
+
+    def _register(self, family: MetricFamily) -> None:
+        with self.lock:
+            if family.name in self.families:
+                raise Exception(f"Metric {family.name} is already declared.")
+
+            self.families[family.name] = family
+
+    def counter(self, name: str, description: str, labels: Tuple[str, ...] = ()) -> CounterFamily:
+        family = CounterFamily("counter", name, description, labels)
+        self._register(family)
+
+        return family
+
+    def histogram(self, name: str, description: str, labels: Tuple[str, ...] = ()) -> HistogramFamily:
+        family = HistogramFamily("histogram", name, description, labels)
+        self._register(family)
+
+        return family
+
+    @staticmethod
+    def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(labels) + ([extra] if extra else [])
+
+        if not pairs:
+            return ""
+
+        return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+    def render(self) -> str:
+        """Render the metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+
+        with self.lock:
+            families = sorted(self.families.items())
+
+        for name, family in families:
+            lines.append(f"# HELP {name} {family.description}")
+            lines.append(f"# TYPE {name} {family.kind}")
+
+            for labels, metric in family.items():
+                if isinstance(metric, Counter):
+                    lines.append(f"{name}{self._format_labels(labels)} {metric.value}")
+                    continue
+
+                with metric.lock:
+                    cumulative = 0
+
+                    for bound, count in zip(metric.buckets + (math.inf,), metric.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == math.inf else str(bound)
+
+                        lines.append(f"{name}_bucket{self._format_labels(labels, ('le', le))} {cumulative}")
+
+                    lines.append(f"{name}_sum{self._format_labels(labels)} {metric.sum}")
+                    lines.append(f"{name}_count{self._format_labels(labels)} {metric.count}")
+
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Summarize the metrics, the counters by value and the histograms by count, mean and estimated p99."""
+        with self.lock:
+            families = list(self.families.items())
+
+        entries = [(name, labels, metric) for name, family in families for labels, metric in family.items()]
+
+        snapshot: Dict[str, Dict[str, float]] = {}
+
+        for name, labels, metric in sorted(entries, key=lambda item: (item[0], item[1])):
+            key = f"{name}{self._format_labels(labels)}"
+
+            if isinstance(metric, Counter):
+                snapshot[key] = {"value": metric.value}
+            elif metric.count:
+                snapshot[key] = {
+                    "count": metric.count,
+                    "mean": round(metric.sum / metric.count, 4),
+                    "p99": metric.quantile(0.99),
+                }
+
+        return snapshot
+
+
+metrics = Metrics()
+
+# Spotify
+SPOTIFY_REQUEST_SECONDS = metrics.histogram("spotify_request_seconds", "Latency of the Spotify requests.", ("route",))
+SPOTIFY_TOKEN_REFRESH_SECONDS = metrics.histogram("spotify_token_refresh_seconds", "Time to refresh the access token.")
+SPOTIFY_RETRIES = metrics.counter("spotify_retries_total", "Spotify requests retried after a failure.", ("route",))
+SPOTIFY_RATELIMITED = metrics.counter("spotify_ratelimited_total", "Spotify requests held back by the ratelimits.", ("route",))
+SPOTIFY_UNAVAILABLE = metrics.counter("spotify_unavailable_total", "Spotify requests failed without a cached response.", ("route",))
+SPOTIFY_STALE_RESPONSES = metrics.counter(
+    "spotify_stale_responses_total", "Expired Spotify responses served while unavailable.", ("route",)
+)
+SPOTIFY_CACHE_HITS = metrics.counter("spotify_cache_hits_total", "Spotify responses served from the cache.", ("route",))
+SPOTIFY_CACHE_MISSES = metrics.counter("spotify_cache_misses_total", "Spotify responses missing from the cache.", ("route",))
+
+# Album art
+ART_CACHE_REQUESTS = metrics.counter("art_cache_requests_total", "Album art requests, by the tier serving them.", ("tier",))
+ART_DOWNLOAD_SECONDS = metrics.histogram("art_download_seconds", "Time to download the album art.")
+
+# Banner
+CYCLE_SECONDS = metrics.histogram("cycle_seconds", "Time to fetch and queue or skip the banner, per cycle.")
+BANNER_UPDATES_SKIPPED = metrics.counter("banner_updates_skipped_total", "Banner updates skipped, by the reason.", ("reason",))
+BANNER_RENDER_SECONDS = metrics.histogram("banner_render_seconds", "Time to render the banner.", ("region",))
+BANNER_ENCODE_SECONDS = metrics.histogram("banner_encode_seconds", "Time to encode the banner.")
+
+# Pipeline
+PIPELINE_RENDER_SECONDS = metrics.histogram("pipeline_render_seconds", "Time to render and encode the banner in a render process.")
+PIPELINE_JOBS_FAILED = metrics.counter("pipeline_jobs_failed_total", "Banner jobs failed, by the stage.", ("stage",))
+PIPELINE_JOBS_DROPPED = metrics.counter("pipeline_jobs_dropped_total", "Stale banner jobs dropped, by the stage.", ("stage",))
+
+# Twitter
+TWITTER_UPLOAD_SECONDS = metrics.histogram("twitter_upload_seconds", "Time to upload the banner to twitter.")
+TWITTER_UPLOADS = metrics.counter("twitter_uploads_total", "Banner uploads to twitter, by the result.", ("result",))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:  # noqa: N802
+        if self.path.split("?")[0] != "/metrics":
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = metrics.render().encode()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:  # noqa: A002
+        pass
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve the metrics at `/metrics` on a background thread."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"Serving the metrics at http://{host}:{server.server_address[1]}/metrics")
+
+    return server
+
+
+def start_metrics_logging(interval: float) -> threading.Thread:
+    """Log the summary of the metrics as a JSON line, every `interval` seconds."""
+    def log() -> None:
+        while True:
+            time.sleep(interval)
+            logger.info(f"Metrics {json.dumps(metrics.snapshot(), default=str)}")
+
+    thread = threading.Thread(target=log, name="metrics-log", daemon=True)
+    thread.start()
+
+    return thread
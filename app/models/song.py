@@ -1,13 +1,27 @@
-from dataclasses import dataclass, field
-from io import BytesIO
+from dataclasses import dataclass
 from typing import Any, Dict, Literal, Optional
 
-import requests
 from PIL import Image
 
+from ..image.art import art_cache
+
 
 @dataclass
 class Song:
+    # Kept compact, as a song is created every cycle. The album art is looked up in the art cache when drawn.
+    __slots__ = (
+        "name",
+        "artist",
+        "album",
+        "is_explicit",
+        "currently_playing_type",
+        "is_now_playing",
+        "image_url",
+        "progress_ms",
+        "duration_ms",
+        "id",
+    )
+
     name: str
     artist: str
     album: str
@@ -18,13 +32,16 @@ class Song:
     is_now_playing: bool
 
     image_url: str
-    image: Image.Image = field(init=False, repr=False)
 
     progress_ms: Optional[int]
     duration_ms: Optional[int]
 
-    def __post_init__(self):
-        self.image = Image.open(BytesIO(requests.get(self.image_url).content))
+    id: Optional[str]
+
+    @property
+    def image(self) -> Image.Image:
+        """Get the album art, shared with the art cache and already thumbnailed to fit the banner."""
+        return art_cache.get(self.image_url)
 
     @classmethod
     def from_json(cls, song: Dict[str, Any]) -> "Song":
@@ -57,4 +74,5 @@ class Song:
             img_url,
             progress_ms,
             duration_ms,
+            song.get("id"),
         )
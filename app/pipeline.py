@@ -0,0 +1,195 @@
+import multiprocessing
+import queue
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional, cast
+
+from loguru import logger
+
+from .image.art import art_cache
+from .image.generate import render_banner
+from .metrics import PIPELINE_JOBS_DROPPED, PIPELINE_JOBS_FAILED, PIPELINE_RENDER_SECONDS
+from .models.song import Song
+
+
+@dataclass
+class BannerJob:
+    """Compact, picklable snapshot of everything needed to render and upload a banner."""
+
+    account: str
+
+    # Order of the jobs of the account, a job is stale once a newer one exists.
+    sequence: int
+
+    status: str
+    song: Dict[str, Any]
+    top_tracks: List[Dict[str, Any]]
+    fingerprint: str
+
+    # Encoded album art, and the encoded banner, filled in by the stages.
+    art: Optional[bytes] = None
+    banner: Optional[bytes] = None
+
+    @classmethod
+    def create(cls, account: str, sequence: int, status: str, song: Song, top_tracks: list, fingerprint: str) -> "BannerJob":
+        # Only keep the fields of the top tracks that are drawn.
+        top_tracks = [{"name": track["name"], "artists": [{"name": track["artists"][0]["name"]}]} for track in top_tracks]
+
+        return cls(account, sequence, status, asdict(song), top_tracks, fingerprint)
+
+
+def render_job(job: BannerJob) -> bytes:
+    """Render and encode the banner of the job, in a render process."""
+    # Decode the art passed along, so the render process never downloads it.
+    art_cache.load(job.song["image_url"], cast(bytes, job.art))
+
+    return render_banner(job.status, Song(**job.song), job.top_tracks).getvalue()
+
+
+class StageError(Exception):
+    """Raised by a stage for an expected failure, such as a failed upload, logged without the traceback."""
+
+
+# Marks the end of the jobs, for the stage workers to exit.
+_STOP = None
+
+
+class BannerPipeline:
+    """Pipeline of the stages after fetching: getting the art, rendering and encoding, and uploading.
+
+    The stages are connected with bounded queues, so a slow stage holds back the ones before it instead of piling
+    up jobs. Rendering and encoding run on a process pool, and stale jobs are dropped before rendering.
+    """
+
+    def __init__(
+        self,
+        upload: Callable[[BannerJob], None],
+        render_workers: int,
+        art_workers: int = 2,
+        upload_workers: int = 2,
+        queue_size: int = 16,
+        on_discard: Optional[Callable[[BannerJob], None]] = None
+    ) -> None:
+        self.upload = upload
+
+        # Called with the jobs that are dropped or failed, and won't be uploaded.
+        self.on_discard = on_discard
+
+        self.art_queue: "queue.Queue[Optional[BannerJob]]" = queue.Queue(maxsize=queue_size)
+        self.render_queue: "queue.Queue[Optional[BannerJob]]" = queue.Queue(maxsize=queue_size)
+        self.upload_queue: "queue.Queue[Optional[BannerJob]]" = queue.Queue(maxsize=queue_size)
+
+        self.render_pool = ProcessPoolExecutor(max_workers=render_workers, mp_context=multiprocessing.get_context("spawn"))
+
+        # Latest job submitted, and latest banner uploaded, for each account.
+        self.latest: Dict[str, int] = {}
+        self.uploaded: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+        # Processed, dropped and failed jobs of each stage.
+        self.stats: Counter = Counter()
+
+        # Stage, the queue it takes jobs from, the number of workers and their threads.
+        self.stages = [
+            (self._get_art, self.art_queue, art_workers, []),
+            (self._render, self.render_queue, render_workers, []),
+            (self._upload, self.upload_queue, upload_workers, []),
+        ]
+
+    def start(self) -> None:
+        for stage, jobs, workers, threads in self.stages:
+            for i in range(workers):
+                thread = threading.Thread(target=self._work, args=(stage, jobs), name=f"{stage.__name__[1:]}-{i}", daemon=True)
+                thread.start()
+
+                threads.append(thread)
+
+    def stop(self) -> None:
+        """Stop the workers stage by stage, after the queued jobs are processed."""
+        for _, jobs, workers, threads in self.stages:
+            for _ in range(workers):
+                jobs.put(_STOP)
+
+            for thread in threads:
+                thread.join()
+
+        self.render_pool.shutdown(wait=True)
+
+    def submit(self, job: BannerJob) -> None:
+        """Queue the job, making the earlier jobs of the account stale. Blocks while the first stage is full."""
+        with self.lock:
+            self.latest[job.account] = max(self.latest.get(job.account, 0), job.sequence)
+
+        self.art_queue.put(job)
+
+    def is_stale(self, job: BannerJob) -> bool:
+        with self.lock:
+            return job.sequence < self.latest.get(job.account, 0)
+
+    def _work(self, stage: Callable[[BannerJob], None], jobs: "queue.Queue[Optional[BannerJob]]") -> None:
+        name = stage.__name__[1:]
+
+        while True:
+            job = jobs.get()
+
+            if job is _STOP:
+                return
+
+            try:
+                stage(job)
+            except Exception as error:
+                self.stats[f"{name}_failed"] += 1
+                PIPELINE_JOBS_FAILED.labels(stage=name).inc()
+
+                if isinstance(error, StageError):
+                    logger.error(f"[{job.account}] {error}")
+                else:
+                    logger.exception(f"[{job.account}] Failed to {name.replace('_', ' ')} for the banner.")
+
+                self._discard(job)
+
+    def _discard(self, job: BannerJob) -> None:
+        if self.on_discard is not None:
+            self.on_discard(job)
+
+    # Stages
+    def _get_art(self, job: BannerJob) -> None:
+        job.art = art_cache.get_encoded(job.song["image_url"])
+        self.render_queue.put(job)
+
+    def _render(self, job: BannerJob) -> None:
+        # Drop the job if a newer one arrived, before and after spending a process on it.
+        if self.is_stale(job):
+            self.stats["render_dropped"] += 1
+            PIPELINE_JOBS_DROPPED.labels(stage="render").inc()
+            return self._discard(job)
+
+        with PIPELINE_RENDER_SECONDS.time():
+            job.banner = self.render_pool.submit(render_job, job).result()
+
+        job.art = None
+
+        if self.is_stale(job):
+            self.stats["render_dropped"] += 1
+            PIPELINE_JOBS_DROPPED.labels(stage="render").inc()
+            return self._discard(job)
+
+        self.stats["rendered"] += 1
+        self.upload_queue.put(job)
+
+    def _upload(self, job: BannerJob) -> None:
+        # Never replace a newer banner which is already uploaded.
+        with self.lock:
+            if job.sequence < self.uploaded.get(job.account, 0):
+                self.stats["upload_dropped"] += 1
+                PIPELINE_JOBS_DROPPED.labels(stage="upload").inc()
+                return self._discard(job)
+
+        self.upload(job)
+
+        with self.lock:
+            self.uploaded[job.account] = max(self.uploaded.get(job.account, 0), job.sequence)
+
+        self.stats["uploaded"] += 1
@@ -0,0 +1,178 @@
+import cProfile
+import glob
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from types import FrameType
+from typing import Iterator, List, Optional
+
+from loguru import logger
+
+from .config import Config
+
+# Frames kept of the allocation tracebacks, and the allocation sites written per profile.
+TRACEMALLOC_FRAMES = 10
+TOP_ALLOCATIONS = 30
+
+# Extensions of the files written per profiled cycle.
+PROFILE_FILES = (".pstats", ".folded", ".allocations.txt")
+
+
+class StackSampler:
+    """Sample the call stack of a thread at an interval, counting the stacks in the folded format of flamegraphs."""
+
+    def __init__(self, thread_id: int, interval: float = 0.005) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+
+        self.stacks: Counter = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._sample, name="stack-sampler", daemon=True)
+
+    @staticmethod
+    def _frame_name(frame: FrameType) -> str:
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def _sample(self) -> None:
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack: List[str] = []
+
+            while frame is not None:
+                stack.append(self._frame_name(frame))
+                frame = frame.f_back
+
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self) -> "StackSampler":
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class CycleProfiler:
+    """Profile every Nth cycle, writing the files of the last profiles to the directory.
+
+    A profiled cycle runs under `cProfile` (a `.pstats` file for pstats and snakeviz), a stack sampler (a `.folded`
+    file for flamegraph.pl and speedscope), and `tracemalloc` (the allocations the cycle left behind). The other
+    cycles only count, so the overhead is bounded by the sampling rate. Only one cycle is profiled at a time.
+    """
+
+    def __init__(self, every: int, directory: str, keep: int = 20, sample_interval: float = 0.005) -> None:
+        self.every = every
+        self.directory = directory
+        self.keep = keep
+        self.sample_interval = sample_interval
+
+        self.cycles = 0
+        self.active = False
+        self.lock = threading.Lock()
+
+    def _due(self) -> Optional[int]:
+        """Count the cycle, returning its number if it's profiled."""
+        with self.lock:
+            self.cycles += 1
+
+            if not self.every or self.active or self.cycles % self.every:
+                return None
+
+            self.active = True
+            return self.cycles
+
+    @contextmanager
+    def cycle(self, name: str = "cycle") -> Iterator[None]:
+        number = self._due()
+
+        if number is None:
+            yield
+            return
+
+        # Keep tracing, if something else already traces the allocations.
+        tracing = tracemalloc.is_tracing()
+
+        if not tracing:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+
+        before = tracemalloc.take_snapshot()
+
+        sampler = StackSampler(threading.get_ident(), self.sample_interval).start()
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+
+        profile.enable()
+
+        try:
+            yield
+        finally:
+            profile.disable()
+            elapsed = time.perf_counter() - start
+
+            sampler.stop()
+            after = tracemalloc.take_snapshot()
+
+            if not tracing:
+                tracemalloc.stop()
+
+            try:
+                self._write(f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{number}", profile, sampler, before, after, elapsed)
+            except OSError:
+                logger.exception("Failed to write the profile of the cycle.")
+            finally:
+                with self.lock:
+                    self.active = False
+
+    def _write(
+        self,
+        stem: str,
+        profile: cProfile.Profile,
+        sampler: StackSampler,
+        before: tracemalloc.Snapshot,
+        after: tracemalloc.Snapshot,
+        elapsed: float
+    ) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, stem)
+
+        profile.dump_stats(path + ".pstats")
+
+        with open(path + ".folded", "w") as file:
+            file.write(sampler.folded())
+
+        # Leave out the allocations of the profilers themselves.
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        differences = after.filter_traces(filters).compare_to(before.filter_traces(filters), "lineno")
+
+        with open(path + ".allocations.txt", "w") as file:
+            file.write(f"Allocations left behind by the cycle, which took {elapsed * 1000:.1f}ms.\n")
+
+            for difference in differences[:TOP_ALLOCATIONS]:
+                file.write(f"{difference}\n")
+
+        logger.info(f"Profiled the cycle in {elapsed * 1000:.1f}ms, Saved to {path}.*")
+        self._rotate()
+
+    def _rotate(self) -> None:
+        """Delete the oldest profiles, keeping the last ones."""
+        profiles = sorted(glob.glob(os.path.join(self.directory, "*.pstats")), key=os.path.getmtime)
+
+        for profile in profiles[:max(len(profiles) - self.keep, 0)]:
+            stem = profile[:-len(".pstats")]
+
+            for extension in PROFILE_FILES:
+                if os.path.exists(stem + extension):
+                    os.remove(stem + extension)
+
+
+profiler = CycleProfiler(Config.PROFILE_EVERY, Config.PROFILE_PATH, Config.PROFILE_KEEP)
@@ -0,0 +1,52 @@
+import random
+from typing import Optional
+
+from .models.song import Song
+
+
+class Scheduler:
+    """Decide how long to wait before the next update, from the playback state of the song.
+
+    While a song is playing, it wakes up just after the song should end, or after the maximum interval to
+    keep the progress updated. While nothing is playing, it backs off exponentially up to the idle maximum.
+    """
+
+    def __init__(
+        self,
+        min_interval: float,
+        max_interval: float,
+        idle_max_interval: float,
+        track_end_grace: float = 3,
+        jitter: float = 0.1
+    ) -> None:
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.idle_max_interval = idle_max_interval
+
+        # Time to wait after the song should end, for the next song to start.
+        self.track_end_grace = track_end_grace
+
+        # Randomize the intervals by this ratio, to avoid waking up in lockstep.
+        self.jitter = jitter
+
+        self.idle_cycles = 0
+
+    def next_delay(self, song: Optional[Song], elapsed: float = 0) -> float:
+        """Get the seconds to wait, given the song fetched `elapsed` seconds ago."""
+        if song is not None and song.is_now_playing and song.duration_ms and song.progress_ms is not None:
+            self.idle_cycles = 0
+
+            remaining = (song.duration_ms - song.progress_ms) / 1000 + self.track_end_grace
+
+            if remaining <= self.max_interval:
+                # Only delay the wake up, waking before the song ends would miss the change.
+                delay = remaining * (1 + random.uniform(0, self.jitter))
+            else:
+                delay = self.max_interval * (1 + random.uniform(-self.jitter, self.jitter))
+        else:
+            delay = min(self.max_interval * 2 ** self.idle_cycles, self.idle_max_interval)
+            delay *= 1 + random.uniform(-self.jitter, self.jitter)
+
+            self.idle_cycles += 1
+
+        return min(max(delay - elapsed, self.min_interval), self.idle_max_interval)
@@ -0,0 +1,103 @@
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Optional
+
+from loguru import logger
+
+from .api.concurrent import ConcurrentSpotify
+from .fingerprint import compute_fingerprint
+from .image.art import art_cache
+from .image.generate import BannerRenderer, encode_banner
+from .models.song import Song
+from .utils import get_status
+
+
+@dataclass
+class SpeculativeBanner:
+    song_id: str
+    fingerprint: str
+    banner: bytes
+
+
+class BannerSpeculator:
+    """Pre-render the banner of the next track in the queue, while waiting for the playing track to end.
+
+    The banner is rendered with the progress expected at the next update, on its own renderer so the layers
+    cached for the playing track are kept. If the next update finds the queued track playing, the banner is
+    ready to upload right away.
+    """
+
+    def __init__(self, spotify: ConcurrentSpotify) -> None:
+        self.spotify = spotify
+        self.renderer = BannerRenderer()
+
+        self.future: Optional["Future[Optional[SpeculativeBanner]]"] = None
+
+        self.hits = 0
+        self.misses = 0
+
+    def speculate(self, song: Song, top_tracks: list, delay: float) -> None:
+        """Pre-render the next track in the background, if the song ends before the next update in `delay` seconds."""
+        self.future = None
+
+        if not song.is_now_playing or song.duration_ms is None or song.progress_ms is None:
+            return
+
+        # Progress of the next track by the next update.
+        progress_ms = int(delay * 1000) - (song.duration_ms - song.progress_ms)
+
+        if progress_ms < 0:
+            return
+
+        self.future = self.spotify.submit(self._prepare, top_tracks, progress_ms)
+
+    def _prepare(self, top_tracks: list, progress_ms: int) -> Optional[SpeculativeBanner]:
+        queue = self.spotify.spotify.queue()
+
+        # Only tracks are predicted, the podcast episodes in the queue are skipped over.
+        if not queue or not queue.get("queue") or queue["queue"][0].get("type", "track") != "track":
+            return None
+
+        song = Song.from_json({
+            **queue["queue"][0],
+            "currently_playing_type": "track",
+            "is_now_playing": True,
+            "progress_ms": min(progress_ms, queue["queue"][0]["duration_ms"]),
+        })
+
+        if song.id is None:
+            return None
+
+        # Download the album art, and render the banner the next update would.
+        art_cache.get(song.image_url)
+        status = get_status(song)
+
+        banner = encode_banner(self.renderer.render_frame(status, song, top_tracks))
+        logger.debug(f"Pre-rendered the banner of the next track, {song.name}")
+
+        return SpeculativeBanner(song.id, compute_fingerprint(status, song, top_tracks), banner.getvalue())
+
+    def take(self, song: Song) -> Optional[SpeculativeBanner]:
+        """Get the pre-rendered banner, if the song is the predicted track."""
+        future, self.future = self.future, None
+
+        if future is None or not song.is_now_playing:
+            return None
+
+        # Don't wait for a pre-render still in progress, rendering the banner as usual is as fast.
+        if not future.done():
+            future.cancel()
+            return None
+
+        try:
+            speculative = future.result()
+        except Exception:
+            logger.exception("Failed to pre-render the banner of the next track.")
+            return None
+
+        if speculative is None or speculative.song_id != song.id:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return speculative
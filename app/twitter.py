@@ -1,8 +1,63 @@
+import os
+from io import BytesIO
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
 import tweepy
+from requests import PreparedRequest, RequestException, Response
+from requests.adapters import HTTPAdapter
 
+from .api.retry import RetryPolicy
 from .config import Config
+from .metrics import TWITTER_UPLOAD_SECONDS
+
+
+class _BaseURLAdapter(HTTPAdapter):
+    """Adapter sending the requests to another base URL, as tweepy always uses HTTPS with the Twitter hosts."""
+
+    def __init__(self, base_url: str) -> None:
+        super().__init__()
+        self.base_url = base_url.rstrip("/")
+
+    def send(self, request: PreparedRequest, **kwargs: Any) -> Response:
+        url = urlsplit(request.url)
+        request.url = self.base_url + url.path + (f"?{url.query}" if url.query else "")
+
+        return super().send(request, **kwargs)
+
+
+def create_twitter_api(consumer_key: str, consumer_secret: str, access_token: str, access_token_secret: str) -> tweepy.API:
+    """Create the twitter API for the account, using the configured base URL if any."""
+    auth = tweepy.OAuthHandler(consumer_key, consumer_secret)
+    auth.set_access_token(access_token, access_token_secret)
+
+    api = tweepy.API(auth)
+
+    if Config.TWITTER_API_URL:
+        adapter = _BaseURLAdapter(Config.TWITTER_API_URL)
+
+        api.session.mount(f"https://{api.host}", adapter)
+        api.session.mount(f"https://{api.upload_host}", adapter)
+
+    return api
+
+
+def upload_retry_policy() -> RetryPolicy:
+    """Get the backoff between the retries of a failed upload, from the config."""
+    return RetryPolicy(Config.UPLOAD_RETRY_ATTEMPTS, Config.UPLOAD_RETRY_BASE_DELAY, Config.UPLOAD_RETRY_MAX_DELAY)
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Check if the upload failed on a server or network error, which a retry may get past."""
+    # tweepy raises a plain TweepyException for the errors of the requests, from their handler.
+    return isinstance(error, (tweepy.TwitterServerError, RequestException)) or isinstance(error.__context__, RequestException)
 
 
-def update_twitter_banner(api: tweepy.API) -> None:
-    """Update the twitter banner of the current profile using the image specified in config."""
-    api.update_profile_banner(Config.IMAGE_PATH)
+def update_twitter_banner(api: tweepy.API, image: Optional[BytesIO] = None) -> None:
+    """Update the twitter banner of the current profile using the image in memory, or the image specified in config."""
+    with TWITTER_UPLOAD_SECONDS.time():
+        if image is not None:
+            # The filename is only used to tell the type of the image.
+            api.update_profile_banner(os.path.basename(Config.IMAGE_PATH), file=image)
+        else:
+            api.update_profile_banner(Config.IMAGE_PATH)
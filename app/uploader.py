@@ -0,0 +1,159 @@
+import threading
+import time
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Callable, Optional
+
+import requests
+import tweepy
+from loguru import logger
+
+from .api.retry import RetryPolicy
+from .metrics import BANNER_UPDATES_SKIPPED, TWITTER_UPLOADS
+from .twitter import is_transient_error, update_twitter_banner, upload_retry_policy
+
+
+@dataclass
+class PendingBanner:
+    banner: bytes
+    fingerprint: Optional[str] = None
+
+    # Failed uploads of the banner so far.
+    attempts: int = 0
+
+
+class BannerUploader:
+    """Upload the banners on a background thread, so the updates never wait for twitter.
+
+    At most one banner is pending, a new banner replaces the one that isn't sent yet. Uploads failing on a server
+    or network error are retried with backoff, and waiting out the rate limit reset when twitter rate limits the
+    uploads.
+    """
+
+    def __init__(
+        self,
+        api: tweepy.API,
+        on_uploaded: Optional[Callable[[PendingBanner], None]] = None,
+        retry_policy: Optional[RetryPolicy] = None
+    ) -> None:
+        self.api = api
+        self.on_uploaded = on_uploaded
+
+        self.retry_policy = retry_policy or upload_retry_policy()
+
+        # Banner waiting to be uploaded, and the banner being uploaded.
+        self.pending: Optional[PendingBanner] = None
+        self.sending: Optional[PendingBanner] = None
+        self.condition = threading.Condition()
+
+        # Don't upload before this time (epoch), set on failures and rate limits.
+        self.not_before = 0.0
+
+        self.uploaded = 0
+        self.coalesced = 0
+
+        self.stopped = False
+        self.thread = threading.Thread(target=self._run, name="uploader", daemon=True)
+
+    def start(self) -> "BannerUploader":
+        self.thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+        self.thread.join(timeout)
+
+    @property
+    def pending_fingerprint(self) -> Optional[str]:
+        """Get the fingerprint of the banner that is going to be on the profile, once the uploads finish."""
+        with self.condition:
+            pending = self.pending or self.sending
+            return pending.fingerprint if pending is not None else None
+
+    def submit(self, banner: bytes, fingerprint: Optional[str] = None) -> None:
+        """Queue the banner for upload, replacing the pending banner if it isn't sent yet."""
+        with self.condition:
+            if self.pending is not None:
+                self.coalesced += 1
+                BANNER_UPDATES_SKIPPED.labels(reason="replaced").inc()
+                logger.debug("Replacing the banner waiting to be uploaded.")
+
+            self.pending = PendingBanner(banner, fingerprint)
+            self.condition.notify_all()
+
+    def _take(self) -> Optional[PendingBanner]:
+        """Wait for a pending banner which is due to upload, or until stopped."""
+        with self.condition:
+            while not self.stopped:
+                delay = self.not_before - time.time()
+
+                if self.pending is not None and delay <= 0:
+                    self.sending, self.pending = self.pending, None
+                    return self.sending
+
+                self.condition.wait(delay if self.pending is not None else None)
+
+            return None
+
+    def _retry(self, pending: PendingBanner, not_before: float) -> None:
+        """Retry the banner later, unless it was replaced by a newer one in the meantime."""
+        with self.condition:
+            self.not_before = not_before
+
+            # Requeue and clear the banner being sent at once, so the pending fingerprint never skips it.
+            self.sending = None
+
+            if self.pending is None:
+                self.pending = pending
+
+    def _run(self) -> None:
+        while True:
+            pending = self._take()
+
+            if pending is None:
+                return
+
+            try:
+                self._upload(pending)
+            except Exception:
+                logger.exception("Failed to upload the banner.")
+            finally:
+                with self.condition:
+                    self.sending = None
+
+    def _upload(self, pending: PendingBanner) -> None:
+        try:
+            update_twitter_banner(self.api, BytesIO(pending.banner))
+        except tweepy.TooManyRequests as error:
+            reset = int(error.response.headers.get("x-rate-limit-reset", 0))
+            TWITTER_UPLOADS.labels(result="ratelimited").inc()
+            logger.warning(f"Rate limited by twitter, Uploading after {max(reset - time.time(), 0):.0f} seconds.")
+
+            return self._retry(pending, max(reset, time.time() + self.retry_policy.base_delay))
+        except (tweepy.TweepyException, requests.RequestException) as error:
+            pending.attempts += 1
+            TWITTER_UPLOADS.labels(result="failed").inc()
+
+            # Anything but a server or network error, such as invalid credentials, won't be fixed by retrying.
+            if not is_transient_error(error):
+                logger.error(f"Failed to upload the banner: {error}")
+                return
+
+            if pending.attempts >= self.retry_policy.attempts:
+                logger.error(f"Failed to upload the banner after {pending.attempts} attempts: {error}")
+                return
+
+            delay = self.retry_policy.delay(pending.attempts - 1)
+            logger.warning(f"Failed to upload the banner, Retrying in {delay:.0f} seconds: {error}")
+
+            return self._retry(pending, time.time() + delay)
+
+        self.uploaded += 1
+        TWITTER_UPLOADS.labels(result="uploaded").inc()
+        logger.info("Updated twitter banner")
+
+        if self.on_uploaded is not None:
+            self.on_uploaded(pending)
@@ -1,10 +1,18 @@
+import functools
 import random
-from typing import TYPE_CHECKING
+from typing import Any, Callable, Dict, Optional, TYPE_CHECKING
 
+from loguru import logger
+
+from .api.retry import SpotifyUnavailableError
+from .config import Config
+from .image.art import art_cache
 from .models.song import Song
 
 if TYPE_CHECKING:
+    from .api.concurrent import ConcurrentSpotify
     from .api.spotify import Spotify
+    from .history import ListeningHistory
 
 
 # Generate the OAuth2 URL for spotify
@@ -13,11 +21,8 @@ def generate_oauth_url(client_id: str, redirect_uri: str, scopes: list) -> str:
            f"{redirect_uri}&scope={','.join(scopes)}"
 
 
-# Parse JSON data for song into Song object.
-def get_song_info(spotify: "Spotify") -> Song:
-    # Get the currently playing track.
-    now_playing = spotify.currently_playing()
-
+# Get the JSON data for the song, switching to a recently played song if no song is playing.
+def _get_song_json(now_playing: Optional[Dict[str, Any]], get_recently_played_track: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
     # Check if song is playing.
     if now_playing and now_playing != {}:
         song = now_playing["item"]
@@ -31,17 +36,69 @@ def get_song_info(spotify: "Spotify") -> Song:
         # `progress_ms` is not in `song`, and instead in `now_playing`
         song["progress_ms"] = now_playing["progress_ms"]
     else:
-        # Get recently played songs.
-        recently_played = spotify.recently_played()
-
-        # Get a random song.
-        size_recently_played = len(recently_played["items"])
-        idx = random.randint(0, size_recently_played - 1)
-
-        song = recently_played["items"][idx]["track"]
+        song = get_recently_played_track()
 
         # Add track type, if not actively playing.
         song["currently_playing_type"] = "track"
         song["is_now_playing"] = False
 
-    return Song.from_json(song)
+    return song
+
+
+# Get a random recently played track, from the listening history if there is one.
+def _get_recently_played_track(spotify: "Spotify", history: Optional["ListeningHistory"] = None) -> Dict[str, Any]:
+    if history is not None:
+        # Fetch only the new plays, and pick from the stored ones, also while spotify is unavailable.
+        try:
+            history.sync(spotify)
+        except SpotifyUnavailableError as error:
+            logger.warning(f"Failed to sync the listening history: {error}")
+
+        track = history.random_track()
+
+        if track is not None:
+            return track
+
+    # Get recently played songs.
+    recently_played = spotify.recently_played()
+
+    # Get a random song.
+    size_recently_played = len(recently_played["items"])
+    idx = random.randint(0, size_recently_played - 1)
+
+    return recently_played["items"][idx]["track"]
+
+
+# Parse JSON data for song into Song object.
+def get_song_info(spotify: "Spotify", history: Optional["ListeningHistory"] = None) -> Song:
+    # Get the currently playing track.
+    now_playing = spotify.currently_playing()
+
+    return Song.from_json(_get_song_json(now_playing, functools.partial(_get_recently_played_track, spotify, history)))
+
+
+# Parse JSON data for song into Song object, with the requests running concurrently.
+def get_song_info_concurrently(spotify: "ConcurrentSpotify", history: Optional["ListeningHistory"] = None) -> Song:
+    now_playing = spotify.currently_playing()
+
+    # Fetch the recently played songs upfront, so the cycle doesn't wait for them if nothing is playing.
+    if Config.PREFETCH_RECENTLY_PLAYED:
+        recently_played_track = spotify.submit(_get_recently_played_track, spotify.spotify, history)
+        get_recently_played_track = recently_played_track.result
+    else:
+        get_recently_played_track = functools.partial(_get_recently_played_track, spotify.spotify, history)
+
+    song = Song.from_json(_get_song_json(now_playing.result(), get_recently_played_track))
+
+    # Download the album art, while any other requests are still in flight.
+    art_cache.get(song.image_url)
+
+    return song
+
+
+# Get the status shown above the song.
+def get_status(song: Song) -> str:
+    # Pick the status using the song as seed, so the same track keeps the same banner.
+    rng = random.Random(f"{song.name}|{song.artist}|{song.album}")
+
+    return rng.choice(Config.STATUS_MAPPING[song.is_now_playing]) + ":"
@@ -0,0 +1,91 @@
+import argparse
+import os
+import tempfile
+import time
+
+from dev.stubs import configure_environment, write_accounts
+from dev.stubs.spotify import SpotifyStub
+from dev.stubs.twitter import TwitterStub
+
+# Simulated latency of every request to the stand-ins (in seconds).
+SPOTIFY_LATENCY = 0.05
+TWITTER_LATENCY = 0.2
+
+ACCOUNTS = 16
+DURATION = 10
+
+# Pool sizes to compare, as (I/O workers, render processes).
+POOLS = [(1, 1), (8, 2), (16, os.cpu_count() or 1)]
+
+
+def main() -> None:
+    """Set up the stand-ins and accounts, the render processes import this module so it has no side effects."""
+    parser = argparse.ArgumentParser(description="Compare the cycle and upload rates of multiple accounts across the pool sizes.")
+    parser.add_argument("--profile", type=int, default=0, metavar="N", help="Profile every Nth cycle to the profiles directory.")
+
+    args = parser.parse_args()
+
+    # The app reads the configuration on import.
+    if args.profile:
+        os.environ["PROFILE_EVERY"] = str(args.profile)
+
+    spotify_stub = SpotifyStub(latency=SPOTIFY_LATENCY).start()
+    twitter_stub = TwitterStub(latency=TWITTER_LATENCY).start()
+    configure_environment(spotify_stub.url, twitter_stub.url)
+
+    # Keep the caches and the request budget out of the way, so every cycle does the full work.
+    cache_dir = tempfile.mkdtemp()
+    os.environ["ACCOUNTS_CACHE_DIR"] = ""
+    os.environ["ART_CACHE_DIR"] = cache_dir
+    os.environ["TOP_TRACKS_CACHE_TTL"] = "0"
+    os.environ["RECENTLY_PLAYED_CACHE_TTL"] = "0"
+    os.environ["SPOTIFY_RATE_LIMIT"] = "1000"
+
+    accounts_file = os.path.join(cache_dir, "accounts.json")
+    os.environ["ACCOUNTS_FILE"] = accounts_file
+
+    write_accounts(accounts_file, ACCOUNTS)
+
+    # The app reads the configuration on import.
+    from app.accounts import load_accounts
+    from app.engine import BannerEngine
+    from app.scheduler import Scheduler
+
+    for io_workers, render_workers in POOLS:
+        engine = BannerEngine(
+            load_accounts(accounts_file),
+            io_workers=io_workers,
+            render_workers=render_workers,
+            # Run the cycles back to back.
+            scheduler_factory=lambda: Scheduler(0, 0, 0, jitter=0),
+            skip_unchanged=False,
+        )
+
+        # Warm up the render processes, and the access tokens.
+        engine.run(duration=2)
+        engine.cycles.clear()
+        uploaded = engine.pipeline.stats["uploaded"]
+
+        start = time.monotonic()
+        engine.run(duration=DURATION)
+        elapsed = time.monotonic() - start
+
+        cycles = sum(engine.cycles.values())
+        uploads = engine.pipeline.stats["uploaded"] - uploaded
+        slowest = min(engine.cycles[state.account.name] for state in engine.states)
+
+        engine.stop()
+
+        print(
+            f"{io_workers:>2} I/O workers, {render_workers:>2} render processes | "
+            f"{cycles / elapsed:6.1f} cycles/s | {uploads / elapsed:6.1f} uploads/s | "
+            f"fewest cycles of an account: {slowest} | stale renders dropped: {engine.pipeline.stats['render_dropped']} | "
+            f"failures: {sum(engine.failures.values())}"
+        )
+
+    spotify_stub.stop()
+    twitter_stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import os
+import statistics
+import time
+
+from dev.stubs import configure_environment
+from dev.stubs.spotify import SpotifyStub
+
+# Simulated latency of every request to the stand-in (in seconds).
+LATENCY = 0.1
+ROUNDS = 5
+
+stub = SpotifyStub(latency=LATENCY).start()
+configure_environment(stub.url)
+
+# Measure the requests, not the request budget.
+os.environ["SPOTIFY_RATE_LIMIT"] = "1000"
+
+from app.api.concurrent import ConcurrentSpotify  # noqa: E402
+from app.api.spotify import Spotify  # noqa: E402
+from app.image.art import art_cache  # noqa: E402
+from app.profiling import profiler  # noqa: E402
+from app.utils import get_song_info, get_song_info_concurrently  # noqa: E402
+
+spotify = Spotify("stub", "stub")
+concurrent_spotify = ConcurrentSpotify(spotify)
+
+# Get the access token upfront, it isn't part of the cycle.
+spotify.get_access_token()
+
+
+# The album art loads lazily, load it in both cycles as the banner does.
+def sequential_cycle() -> None:
+    spotify.top_tracks(limit=5)
+    song = get_song_info(spotify)
+    song.image
+
+
+def concurrent_cycle() -> None:
+    top_tracks = concurrent_spotify.top_tracks(limit=5)
+    song = get_song_info_concurrently(concurrent_spotify)
+    top_tracks.result()
+    song.image
+
+
+for name, cycle in (("sequential", sequential_cycle), ("concurrent", concurrent_cycle)):
+    timings = []
+
+    for _ in range(ROUNDS):
+        # Download the album art in every cycle, as it happens on a track change.
+        art_cache.clear(disk=True)
+
+        start = time.perf_counter()
+
+        # Profiled with `PROFILE_EVERY` set.
+        with profiler.cycle(name):
+            cycle()
+
+        timings.append(time.perf_counter() - start)
+
+    print(f"{name:<10} | median {statistics.median(timings) * 1000:7.1f}ms | {LATENCY * 1000:.0f}ms per request")
+
+concurrent_spotify.shutdown()
+stub.stop()
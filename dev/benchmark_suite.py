@@ -0,0 +1,227 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, cast
+
+from PIL import Image, ImageChops
+from dev.stubs import configure_credentials
+from dev.stubs.spotify import FIXTURES_PATH, load_fixture
+
+# Keep the run offline and free of side effects, nothing is fetched or persisted.
+configure_credentials()
+os.environ["HISTORY_PATH"] = ""
+os.environ["RESPONSE_CACHE_PATH"] = ""
+
+from app.config import Fonts  # noqa: E402
+from app.image.art import art_cache  # noqa: E402
+from app.image.encode import banner_profile, encode_jpeg  # noqa: E402
+from app.image.fonts import fonts  # noqa: E402
+from app.image.generate import BannerRenderer, banner_layout, generate_image, renderer  # noqa: E402
+from app.image.text import text_size, truncate_text  # noqa: E402
+from app.models.song import Song  # noqa: E402
+from app.utils import _get_song_json, get_status  # noqa: E402
+
+BASELINE_PATH = ".cache/benchmark-baseline.json"
+
+# Golden banners of the fixtures, rendered by the original renderer, while playing and showing a recently played track.
+GOLDEN_PATHS = {
+    "playing": os.path.join(FIXTURES_PATH, "golden-banner.png"),
+    "idle": os.path.join(FIXTURES_PATH, "golden-banner-idle.png"),
+}
+
+# Time measured per benchmark (in seconds), after the warm up operations.
+DURATION = 1.0
+WARMUP = 3
+
+# Slowdown of the median over the baseline, which fails the run.
+TOLERANCE = 0.25
+
+
+def load_json(name: str) -> Dict[str, Any]:
+    return json.loads(load_fixture(name))
+
+
+def load_fixtures() -> Dict[str, Any]:
+    """Load the recorded responses, with the album art of every track served from memory."""
+    with open(os.path.join(FIXTURES_PATH, "album-art.jpg"), "rb") as file:
+        art = file.read()
+
+    fixtures = {
+        "currently_playing": load_json("currently_playing.json"),
+        "recently_played": load_json("recently_played.json"),
+        "top_tracks": load_json("top_tracks.json")["items"],
+    }
+
+    tracks = [fixtures["currently_playing"]["item"]] + [item["track"] for item in fixtures["recently_played"]["items"]]
+
+    for track in tracks:
+        art_cache.load(track["album"]["images"][1]["url"], art)
+
+    return fixtures
+
+
+def measure(operation: Callable[[], Any], duration: float = DURATION) -> Dict[str, float]:
+    """Time the operation repeatedly, and trace the peak Python memory of a single run."""
+    for _ in range(WARMUP):
+        operation()
+
+    timings: List[float] = []
+    start = time.perf_counter()
+
+    while time.perf_counter() - start < duration or len(timings) < 10:
+        operation_start = time.perf_counter()
+        operation()
+        timings.append(time.perf_counter() - operation_start)
+
+    tracemalloc.start()
+    operation()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    percentiles = statistics.quantiles(timings, n=100)
+
+    return {
+        "ops": len(timings) / sum(timings),
+        "p50": statistics.median(timings),
+        "p99": percentiles[98],
+        "peak_memory": peak,
+    }
+
+
+def benchmarks(fixtures: Dict[str, Any], image_path: str) -> Dict[str, Callable[[], Any]]:
+    now_playing = fixtures["currently_playing"]
+    top_tracks = fixtures["top_tracks"]
+
+    song_json = _get_song_json(json.loads(json.dumps(now_playing)), lambda: {})
+    song = Song.from_json(song_json)
+    status = get_status(song)
+
+    poppins = fonts.get(Fonts.POPPINS_REGULAR, 27)
+    titles = [track["name"] * 4 for track in top_tracks]
+
+    def truncate_cold() -> None:
+        text_size.cache_clear()
+
+        for title in titles:
+            truncate_text(title, poppins, 300)
+
+    def render_progress() -> None:
+        # Alternate the progress, so every render redraws it.
+        song.progress_ms = (cast(int, song.progress_ms) + 1000) % cast(int, song.duration_ms)
+        renderer.render_frame(status, song, top_tracks)
+
+    frame = BannerRenderer().render(status, song, top_tracks)
+
+    return {
+        "parse song": lambda: Song.from_json(song_json),
+        "truncate text (cold)": truncate_cold,
+        "truncate text (cached)": lambda: [truncate_text(title, poppins, 300) for title in titles],
+        "render (full)": lambda: BannerRenderer().render(status, song, top_tracks),
+        "render (progress)": render_progress,
+        "encode jpeg": lambda: encode_jpeg(frame, banner_profile),
+        "generate image": lambda: generate_image(status, song, top_tracks, image_path),
+    }
+
+
+def golden_songs(fixtures: Dict[str, Any]) -> Dict[str, Song]:
+    """Get the songs of the golden banners, the playing track and the last recently played track."""
+    now_playing = json.loads(json.dumps(fixtures["currently_playing"]))
+    recently_played = json.loads(json.dumps(fixtures["recently_played"]["items"][0]["track"]))
+
+    return {
+        "playing": Song.from_json(_get_song_json(now_playing, lambda: {})),
+        "idle": Song.from_json(_get_song_json({}, lambda: recently_played)),
+    }
+
+
+def check_golden(fixtures: Dict[str, Any], update: bool) -> bool:
+    """Compare the banners rendered from the fixtures with the golden banners pixel by pixel, or replace the golden banners."""
+    passed = True
+
+    for name, song in golden_songs(fixtures).items():
+        path = GOLDEN_PATHS[name]
+        banner = BannerRenderer().render(get_status(song), song, fixtures["top_tracks"])
+
+        if update:
+            banner.save(path)
+            print(f"Saved the {name} golden banner to {path}")
+
+            continue
+
+        if not os.path.exists(path):
+            print(f"MISSING {name} golden banner: {path}, save it with --update-golden.")
+            passed = False
+
+            continue
+
+        with Image.open(path) as golden:
+            difference = ImageChops.difference(golden.convert("RGB"), banner.convert("RGB")).getbbox()
+
+        if difference is not None:
+            print(f"MISMATCH {name} golden banner: the banner differs from {path} in {difference}.")
+            passed = False
+        else:
+            print(f"golden banner ({name}) | identical")
+
+    return passed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the parse, text, render and encode paths on the fixtures.")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Path of the baseline to compare with.")
+    parser.add_argument("--save", action="store_true", help="Save the results as the baseline.")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="Allowed slowdown of the median.")
+    parser.add_argument("--duration", type=float, default=DURATION, help="Seconds to measure each benchmark.")
+    parser.add_argument("--update-golden", action="store_true", help="Replace the golden banners.")
+    parser.add_argument("--golden-only", action="store_true", help="Only compare the banners with the golden banners.")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures()
+    fonts.preload(banner_layout.fonts)
+
+    if args.golden_only:
+        sys.exit(0 if check_golden(fixtures, args.update_golden) else 1)
+
+    results = {}
+
+    for name, operation in benchmarks(fixtures, os.devnull).items():
+        results[name] = result = measure(operation, args.duration)
+
+        print(
+            f"{name:<22} | {result['ops']:9.1f} ops/s | p50 {result['p50'] * 1000:8.3f}ms | "
+            f"p99 {result['p99'] * 1000:8.3f}ms | peak {result['peak_memory'] / 1024:8.1f} KiB"
+        )
+
+    failed = not check_golden(fixtures, args.update_golden)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=2)
+
+        print(f"Saved the baseline to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+
+            slowdown = result["p50"] / baseline[name]["p50"] - 1
+
+            if slowdown > args.tolerance:
+                print(f"REGRESSION {name}: the median is {slowdown * 100:.0f}% slower than the baseline.")
+                failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
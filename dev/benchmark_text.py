@@ -0,0 +1,58 @@
+import timeit
+
+from PIL import ImageFont
+from dev.stubs import configure_credentials
+
+# The app reads the credentials on import, none are used.
+configure_credentials()
+
+from app.config import Fonts  # noqa: E402
+from app.image.fonts import fonts  # noqa: E402
+from app.image.text import text_size, truncate_text  # noqa: E402
+
+# Titles to fit, with the width they are fitted to on the banner.
+TITLES = {
+    "short": ("Levitating", 600),
+    "long": (
+        "Episode 412: The Complete and Unabridged History of Everything We Forgot to Mention in the Previous "
+        "Four Hundred Episodes, Featuring Very Special Guests and a Surprisingly Long Digression About Coffee",
+        600,
+    ),
+    "cjk": ("夜に駆ける 〜 君と夏の終わり、将来の夢、大きな希望忘れない 〜 十年後の八月また出会えるのを信じて", 300),
+}
+
+ITERATIONS = 200
+
+
+def reference_truncate_text(text: str, font: ImageFont.FreeTypeFont, max_width: int) -> str:
+    """The per character truncation, which the text fitting replaced."""
+    if font.getsize(text)[0] <= max_width:
+        return text.strip()
+
+    while font.getsize(text)[0] > max_width:
+        text = text[:-1]
+
+    return text.strip() + ".."
+
+
+font = fonts.get(Fonts.POPPINS_REGULAR, 27)
+
+for name, (title, max_width) in TITLES.items():
+    expected = reference_truncate_text(title, font, max_width)
+    assert truncate_text(title, font, max_width) == expected, f"Mismatch for the {name} title."
+
+    reference = timeit.timeit(lambda: reference_truncate_text(title, font, max_width), number=ITERATIONS)
+
+    # Measure the search alone, without any widths cached, and the repeated fitting with the widths cached.
+    def cold() -> str:
+        text_size.cache_clear()
+        return truncate_text(title, font, max_width)
+
+    uncached = timeit.timeit(cold, number=ITERATIONS)
+    cached = timeit.timeit(lambda: truncate_text(title, font, max_width), number=ITERATIONS)
+
+    print(
+        f"{name:<6} {len(title):>4} chars | per character: {reference / ITERATIONS * 1e6:9.1f}us | "
+        f"binary search: {uncached / ITERATIONS * 1e6:7.1f}us ({reference / uncached:5.1f}x) | "
+        f"cached: {cached / ITERATIONS * 1e6:6.2f}us ({reference / cached:7.1f}x)"
+    )
@@ -0,0 +1,105 @@
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from dev.stubs import configure_environment, write_accounts
+from dev.stubs.faults import Fault
+from dev.stubs.spotify import SpotifyStub
+from dev.stubs.twitter import TwitterStub
+
+ACCOUNTS = 8
+DURATION = 20
+
+# Latency of the stand-ins, and the random jitter added to it (in seconds).
+SPOTIFY_LATENCY = (0.05, 0.1)
+TWITTER_LATENCY = (0.2, 0.3)
+
+# Seconds between expiring the access tokens, forcing the clients to refresh them.
+TOKEN_LIFETIME = 5
+
+# Spotify requests per second of the stand-in accounts, which share a client id and so a single rate limiter.
+RATE_LIMIT = 1000
+
+
+def script_faults(spotify_stub: SpotifyStub, twitter_stub: TwitterStub) -> None:
+    """Fail a share of the requests the way the real APIs do, during an incident."""
+    spotify_stub.faults.set_latency("", *SPOTIFY_LATENCY)
+    spotify_stub.faults.fail_randomly("/v1/", 0.03, Fault(500))
+    spotify_stub.faults.fail_randomly("/v1/", 0.02, Fault(503))
+    spotify_stub.faults.fail_randomly("/v1/", 0.01, Fault(429, retry_after=1))
+    spotify_stub.faults.fail_randomly("/api/token", 0.05, Fault(502))
+
+    twitter_stub.faults.set_latency("", *TWITTER_LATENCY)
+    twitter_stub.faults.fail_randomly("", 0.05, Fault(503))
+    twitter_stub.faults.fail_randomly("", 0.02, Fault(429, retry_after=2))
+
+
+def main() -> None:
+    """Run the accounts against failing stand-ins at a high cycle rate, the render processes import this module."""
+    parser = argparse.ArgumentParser(description="Run multiple accounts against failing stand-ins.")
+    parser.add_argument("--profile", type=int, default=0, metavar="N", help="Profile every Nth cycle to the profiles directory.")
+    parser.add_argument("--rate-limit", type=float, default=RATE_LIMIT, help="Spotify requests per second, shared by the accounts.")
+
+    args = parser.parse_args()
+
+    # The app reads the configuration on import.
+    if args.profile:
+        os.environ["PROFILE_EVERY"] = str(args.profile)
+
+    spotify_stub = SpotifyStub(seed=0).start()
+    twitter_stub = TwitterStub(seed=0).start()
+    configure_environment(spotify_stub.url, twitter_stub.url)
+
+    script_faults(spotify_stub, twitter_stub)
+
+    cache_dir = tempfile.mkdtemp()
+    os.environ["ACCOUNTS_CACHE_DIR"] = os.path.join(cache_dir, "accounts")
+    os.environ["ART_CACHE_DIR"] = os.path.join(cache_dir, "art")
+    os.environ["TOP_TRACKS_CACHE_TTL"] = "2"
+    os.environ["RECENTLY_PLAYED_CACHE_TTL"] = "2"
+    os.environ["SPOTIFY_RATE_LIMIT"] = str(args.rate_limit)
+
+    accounts_file = os.path.join(cache_dir, "accounts.json")
+    write_accounts(accounts_file, ACCOUNTS)
+
+    # The app reads the configuration on import.
+    from app.accounts import load_accounts
+    from app.engine import BannerEngine
+    from app.scheduler import Scheduler
+
+    engine = BannerEngine(
+        load_accounts(accounts_file),
+        # Run the cycles back to back.
+        scheduler_factory=lambda: Scheduler(0, 0, 0, jitter=0),
+        skip_unchanged=False,
+    )
+
+    def expire_tokens() -> None:
+        while not engine.stopped.wait(TOKEN_LIFETIME):
+            spotify_stub.expire_token()
+
+    threading.Thread(target=expire_tokens, daemon=True).start()
+
+    start = time.monotonic()
+    engine.run(duration=DURATION)
+    elapsed = time.monotonic() - start
+
+    engine.stop()
+
+    stats = engine.pipeline.stats
+    cycles = sum(engine.cycles.values())
+
+    print(f"Spotify rate limit: {args.rate_limit:g} requests/s, shared by {ACCOUNTS} accounts")
+    print(f"{cycles / elapsed:6.1f} cycles/s | {stats['uploaded'] / elapsed:6.1f} uploads/s | failed cycles: {sum(engine.failures.values())}")
+    print(f"Dropped renders: {stats['render_dropped']}, dropped uploads: {stats['upload_dropped']}, failed uploads: {stats['upload_failed']}")
+    print(f"Spotify requests: {dict(spotify_stub.requests)}")
+    print(f"Spotify failures injected: {dict(spotify_stub.faults.injected)}, Twitter: {dict(twitter_stub.faults.injected)}")
+
+    spotify_stub.stop()
+    twitter_stub.stop()
+
+
+if __name__ == "__main__":
+    main()
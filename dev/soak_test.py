@@ -0,0 +1,148 @@
+import argparse
+import copy
+import gc
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from dev.stubs import configure_environment
+from dev.stubs.spotify import ART_HOST, SpotifyStub, load_fixture
+from dev.stubs.twitter import TwitterStub
+from loguru import logger
+
+CYCLES = 3000
+WARMUP = 1000
+
+# Cycles between the samples of the resident memory.
+SAMPLE_INTERVAL = 250
+
+# Growth of the resident memory over the warmed up baseline, which fails the run (in MiB).
+TOLERANCE = 8
+
+# Cycles each track plays for.
+TRACK_CYCLES = 20
+
+
+class PlaybackScript:
+    """Currently playing responses of the stand-in, a cycle each, switching the track and its album art every few cycles.
+
+    The resident memory is sampled as the cycles start, after the previous cycle finished.
+    """
+
+    def __init__(self, art_url: str, art_variants: int, warmup: int, sample_interval: int, memory: Callable[[], int]) -> None:
+        now_playing = json.loads(load_fixture("currently_playing.json").replace(ART_HOST, art_url))
+        recently_played = json.loads(load_fixture("recently_played.json").replace(ART_HOST, art_url))["items"]
+
+        self.tracks: List[Dict[str, Any]] = [now_playing] + [{**now_playing, "item": item["track"]} for item in recently_played]
+
+        self.art_variants = art_variants
+
+        self.warmup = warmup
+        self.sample_interval = sample_interval
+        self.memory = memory
+
+        self.cycles = 0
+        self.samples: List[Tuple[int, int]] = []
+        self.lock = threading.Lock()
+
+    def __call__(self) -> bytes:
+        with self.lock:
+            cycle = self.cycles
+            self.cycles += 1
+
+            if cycle >= self.warmup and (cycle - self.warmup) % self.sample_interval == 0:
+                gc.collect()
+                self.samples.append((cycle, self.memory()))
+
+        track = cycle // TRACK_CYCLES
+        now_playing = copy.deepcopy(self.tracks[track % len(self.tracks)])
+
+        # Advance the progress every cycle, and pause every few tracks.
+        now_playing["progress_ms"] = (cycle % TRACK_CYCLES) * 5000
+        now_playing["is_playing"] = track % 5 != 4
+
+        item = now_playing["item"]
+        item["duration_ms"] = max(item["duration_ms"], TRACK_CYCLES * 5000)
+        item["album"]["images"][1]["url"] += f"?variant={track % self.art_variants}"
+
+        return json.dumps(now_playing).encode()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the app loop against the stand-ins, failing if the resident memory grows.")
+    parser.add_argument("--cycles", type=int, default=CYCLES, help="Cycles to run after the warm up.")
+    parser.add_argument("--warmup", type=int, default=WARMUP, help="Cycles to run before taking the baseline.")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="Allowed growth of the resident memory (in MiB).")
+    args = parser.parse_args()
+
+    spotify_stub = SpotifyStub().start()
+    twitter_stub = TwitterStub().start()
+    configure_environment(spotify_stub.url, twitter_stub.url)
+
+    # Keep every cache of the app enabled, in a temporary directory.
+    cache_dir = tempfile.mkdtemp()
+    os.environ["HISTORY_PATH"] = os.path.join(cache_dir, "history.sqlite3")
+    os.environ["RESPONSE_CACHE_PATH"] = os.path.join(cache_dir, "spotify-responses.json")
+    os.environ["TOKEN_CACHE_PATH"] = os.path.join(cache_dir, "spotify-token.json")
+    os.environ["FINGERPRINT_PATH"] = os.path.join(cache_dir, "banner-fingerprint")
+    os.environ["ART_CACHE_DIR"] = os.path.join(cache_dir, "art")
+    os.environ["IN_MEMORY_UPLOAD"] = "true"
+    os.environ["SPECULATIVE_PRERENDER"] = "true"
+    os.environ["MIN_VISUAL_CHANGE"] = "0.001"
+    os.environ["TOP_TRACKS_CACHE_TTL"] = "1"
+
+    # Lift the request budget, so the cycles aren't held back by the rate limiter.
+    os.environ["SPOTIFY_RATE_LIMIT"] = "1000"
+
+    # The app reads the configuration on import.
+    from app.__main__ import run_account
+    from app.bootstrap import create_clients
+    from app.config import Config
+    from app.image.fonts import fonts, resident_memory
+    from app.image.generate import banner_layout
+    from app.scheduler import Scheduler
+
+    if not resident_memory():
+        print("FAILED: the resident memory isn't available on this platform.")
+        sys.exit(1)
+
+    # Only log the problems, the cycles run back to back.
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    # Cycle through more album art URLs than the art cache keeps in memory.
+    script = PlaybackScript(f"{spotify_stub.url}/art", Config.ART_CACHE_MEMORY_SIZE * 2, args.warmup, SAMPLE_INTERVAL, resident_memory)
+    spotify_stub.responses["/v1/me/player/currently-playing"] = script
+
+    fonts.preload(banner_layout.fonts)
+
+    start = time.perf_counter()
+
+    # Run the cycles back to back, without waiting between them.
+    run_account(create_clients(), Scheduler(0, 0, 0, track_end_grace=0, jitter=0), cycles=args.warmup + args.cycles + 1)
+
+    elapsed = time.perf_counter() - start
+    baseline = script.samples[0][1]
+
+    print(f"Baseline after {args.warmup} cycles: {baseline / 1024 ** 2:.1f} MiB")
+
+    for cycle, sample in script.samples[1:]:
+        print(f"{cycle:>7} cycles | {sample / 1024 ** 2:7.1f} MiB | {(sample - baseline) / 1024 ** 2:+6.1f} MiB")
+
+    # Judge by the later samples, after the caches filled up.
+    samples = [sample for _, sample in script.samples[1:]]
+    growth = max(samples[len(samples) // 2:], default=baseline) - baseline
+
+    print(f"{script.cycles / elapsed:.1f} cycles/s | grown by {growth / 1024 ** 2:.1f} MiB over the baseline")
+
+    if growth > args.tolerance * 1024 ** 2:
+        print(f"FAILED: the resident memory grew by more than {args.tolerance} MiB.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
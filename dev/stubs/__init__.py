@@ -0,0 +1,46 @@
+import json
+import os
+from typing import Optional
+
+
+def configure_credentials() -> None:
+    """Set placeholder credentials for the settings not set already. Must run before importing `app`."""
+    for name in (
+        "SPOTIFY_REFRESH_TOKEN",
+        "SPOTIFY_CLIENT_ID",
+        "SPOTIFY_CLIENT_SECRET",
+        "TWITTER_CONSUMER_KEY",
+        "TWITTER_CONSUMER_SECRET",
+        "TWITTER_ACCESS_TOKEN",
+        "TWITTER_ACCESS_TOKEN_SECRET",
+    ):
+        os.environ.setdefault(name, "stub")
+
+
+def configure_environment(spotify_url: str, twitter_url: Optional[str] = None) -> None:
+    """Point the app to the stand-in servers, with placeholder credentials. Must run before importing `app`."""
+    os.environ["SPOTIFY_API_URL"] = f"{spotify_url}/v1"
+    os.environ["SPOTIFY_ACCOUNTS_URL"] = spotify_url
+
+    if twitter_url:
+        os.environ["TWITTER_API_URL"] = twitter_url
+
+    configure_credentials()
+
+
+def write_accounts(path: str, count: int) -> None:
+    """Write an accounts file with placeholder credentials, each account with its own refresh token."""
+    with open(path, "w") as file:
+        json.dump([
+            {
+                "name": f"account-{i}",
+                "spotify_client_id": "stub",
+                "spotify_client_secret": "stub",
+                "spotify_refresh_token": f"stub-{i}",
+                "twitter_consumer_key": "stub",
+                "twitter_consumer_secret": "stub",
+                "twitter_access_token": "stub",
+                "twitter_access_token_secret": "stub",
+            }
+            for i in range(count)
+        ], file)
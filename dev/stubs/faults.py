@@ -0,0 +1,96 @@
+import random
+import threading
+from collections import Counter, defaultdict, deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+
+
+@dataclass
+class Fault:
+    status: int
+
+    # Seconds to wait before retrying, sent with the rate limits.
+    retry_after: Optional[int] = None
+
+
+class FaultScript:
+    """Scripted latency and failures of a stand-in, by path prefix, where the empty prefix matches every path.
+
+    Scripted failures are served once each in order, before the random failures are rolled.
+    """
+
+    def __init__(self, seed: Optional[int] = None) -> None:
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+        self.scripted: Dict[str, Deque[Fault]] = defaultdict(deque)
+        self.rates: Dict[str, List[Tuple[float, Fault]]] = defaultdict(list)
+
+        # Latency and the random jitter added to it (in seconds).
+        self.latencies: Dict[str, Tuple[float, float]] = {}
+
+        # Number of failures served, per status.
+        self.injected: Counter = Counter()
+
+    def fail_next(self, path: str, *faults: Fault) -> None:
+        """Fail the next requests to the path, one fault each."""
+        with self.lock:
+            self.scripted[path].extend(faults)
+
+    def fail_randomly(self, path: str, probability: float, fault: Fault) -> None:
+        """Fail the requests to the path with the probability."""
+        with self.lock:
+            self.rates[path].append((probability, fault))
+
+    def set_latency(self, path: str, latency: float, jitter: float = 0) -> None:
+        with self.lock:
+            self.latencies[path] = (latency, jitter)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.scripted.clear()
+            self.rates.clear()
+            self.latencies.clear()
+
+    @staticmethod
+    def _longest_match(path: str, prefixes: List[str]) -> Optional[str]:
+        matches = [prefix for prefix in prefixes if path.startswith(prefix)]
+        return max(matches, key=len) if matches else None
+
+    def latency_for(self, path: str, default: float) -> float:
+        with self.lock:
+            prefix = self._longest_match(path, list(self.latencies))
+
+            if prefix is None:
+                return default
+
+            latency, jitter = self.latencies[prefix]
+            return latency + self.random.uniform(0, jitter)
+
+    def fault_for(self, path: str) -> Optional[Fault]:
+        """Get the failure to serve for the request, if any."""
+        with self.lock:
+            fault = None
+
+            for prefix in sorted(self.scripted, key=len, reverse=True):
+                if path.startswith(prefix) and self.scripted[prefix]:
+                    fault = self.scripted[prefix].popleft()
+                    break
+
+            if fault is None:
+                for prefix, rates in self.rates.items():
+                    if not path.startswith(prefix):
+                        continue
+
+                    for probability, rate_fault in rates:
+                        if self.random.random() < probability:
+                            fault = rate_fault
+                            break
+
+                    if fault is not None:
+                        break
+
+            if fault is not None:
+                self.injected[fault.status] += 1
+
+            return fault
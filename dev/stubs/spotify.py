@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+from .faults import FaultScript
+
+FIXTURES_PATH = os.path.join(os.path.dirname(__file__), "..", "fixtures")
+
+# Host of the album art in the fixtures, which is replaced with the stand-in.
+ART_HOST = "https://i.scdn.co"
+
+
+def load_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES_PATH, name), encoding="utf-8") as file:
+        return file.read()
+
+
+class SpotifyStub:
+    """Local stand-in for the Spotify API, the accounts service and the album art CDN, serving the fixtures."""
+
+    def __init__(self, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0, seed: Optional[int] = None) -> None:
+        self.latency = latency
+
+        # Scripted latency and failures, on top of the default latency.
+        self.faults = FaultScript(seed)
+
+        # Number of requests served, per path.
+        self.requests: Counter = Counter()
+
+        # Generation of the access token, the tokens of the previous generations are expired.
+        self.token_generation = 0
+
+        handler = type("Handler", (_Handler,), {"stub": self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+
+        # Bodies of the routes, or callables making the body of every request.
+        self.responses: Dict[str, Any] = {
+            "/v1/me/player/currently-playing": self._fixture("currently_playing.json"),
+            "/v1/me/player/recently-played": self._fixture("recently_played.json"),
+            "/v1/me/top/tracks": self._fixture("top_tracks.json"),
+            "/v1/me/player/queue": self._fixture("queue.json"),
+        }
+
+        with open(os.path.join(FIXTURES_PATH, "album-art.jpg"), "rb") as file:
+            self.art = file.read()
+
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def access_token(self) -> str:
+        return f"stub-{self.token_generation}"
+
+    def expire_token(self) -> None:
+        """Expire the issued access token, so the requests fail with 401 until the token is refreshed."""
+        self.token_generation += 1
+
+    def _fixture(self, name: str) -> bytes:
+        return load_fixture(name).replace(ART_HOST, f"{self.url}/art").encode()
+
+    def start(self) -> "SpotifyStub":
+        self.thread = threading.Thread(target=self.server.serve_forever, name="spotify-stub", daemon=True)
+        self.thread.start()
+
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    stub: SpotifyStub
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json") -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status: int, message: str, headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps({"error": {"status": status, "message": message}}).encode()
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _inject(self, path: str) -> bool:
+        """Wait the latency of the path, and serve the scripted failure if any, returning if it was served."""
+        time.sleep(self.stub.faults.latency_for(path, self.stub.latency))
+
+        fault = self.stub.faults.fault_for(path)
+
+        if fault is None:
+            return False
+
+        headers = {"Retry-After": str(fault.retry_after)} if fault.retry_after is not None else None
+        self._error(fault.status, "Injected failure.", headers)
+
+        return True
+
+    def do_GET(self) -> None:  # noqa: N802
+        url = urlparse(self.path)
+        path = url.path
+        self.stub.requests[path] += 1
+
+        if self._inject(path):
+            return
+
+        if path.startswith("/v1/") and self.headers.get("Authorization") != f"Bearer {self.stub.access_token}":
+            self._error(401, "The access token expired")
+        elif path.startswith("/art/"):
+            self._send(200, self.stub.art, "image/jpeg")
+        elif path == "/v1/me/player/recently-played" and "after" in parse_qs(url.query):
+            self._send(200, self._recently_played_after(int(parse_qs(url.query)["after"][0])))
+        elif path in self.stub.responses:
+            response = self.stub.responses[path]
+            self._send(200, response() if callable(response) else response)
+        else:
+            self._error(404, "Not found.")
+
+    def _recently_played_after(self, after: int) -> bytes:
+        """Filter the recently played fixture to the plays after the cursor, like the `after` parameter does."""
+        recently_played = json.loads(self.stub.responses["/v1/me/player/recently-played"])
+        recently_played["items"] = [
+            item for item in recently_played["items"]
+            if datetime.fromisoformat(item["played_at"].replace("Z", "+00:00")).timestamp() * 1000 > after
+        ]
+
+        return json.dumps(recently_played).encode()
+
+    def do_POST(self) -> None:  # noqa: N802
+        path = urlparse(self.path).path
+        self.stub.requests[path] += 1
+
+        # Drain the form body, to keep the connection usable.
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        if self._inject(path):
+            return
+
+        if path == "/api/token":
+            body = {"access_token": self.stub.access_token, "token_type": "Bearer", "scope": "", "expires_in": 3600}
+            self._send(200, json.dumps(body).encode())
+        else:
+            self._send(404, json.dumps({"error": "not_found"}).encode())
+
+    def log_message(self, format: str, *args) -> None:  # noqa: A002
+        pass
@@ -0,0 +1,76 @@
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import urlparse
+
+from .faults import FaultScript
+
+
+class TwitterStub:
+    """Local stand-in for the Twitter profile banner upload."""
+
+    def __init__(self, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0, seed: Optional[int] = None) -> None:
+        self.latency = latency
+
+        # Scripted latency and failures, on top of the default latency. The rate limits are sent as the reset time.
+        self.faults = FaultScript(seed)
+
+        # Number of requests served per path, and the bytes of the uploaded banners.
+        self.requests: Counter = Counter()
+        self.uploaded_bytes = 0
+
+        handler = type("Handler", (_Handler,), {"stub": self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "TwitterStub":
+        self.thread = threading.Thread(target=self.server.serve_forever, name="twitter-stub", daemon=True)
+        self.thread.start()
+
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    stub: TwitterStub
+
+    def do_POST(self) -> None:  # noqa: N802
+        path = urlparse(self.path).path
+        self.stub.requests[path] += 1
+
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.stub.faults.latency_for(path, self.stub.latency))
+
+        fault = self.stub.faults.fault_for(path)
+
+        if fault is not None:
+            status = fault.status
+        elif path == "/1.1/account/update_profile_banner.json":
+            self.stub.uploaded_bytes += len(body)
+            status = 201
+        else:
+            status = 404
+
+        self.send_response(status)
+
+        if fault is not None and fault.retry_after is not None:
+            self.send_header("x-rate-limit-reset", str(int(time.time()) + fault.retry_after))
+
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format: str, *args) -> None:  # noqa: A002
+        pass
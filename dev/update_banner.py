@@ -1,24 +1,37 @@
-import random
+import argparse
 
-from app import spotify, twitter
+from app.bootstrap import configure_logging, create_clients
 from app.config import Config
 from app.image.generate import generate_image
+from app.profiling import profiler
 from app.twitter import update_twitter_banner
-from app.utils import get_song_info
+from app.utils import get_song_info, get_status
 
-# Get top tracks.
-top_tracks = spotify.top_tracks(limit=5)
+parser = argparse.ArgumentParser(description="Generate the banner image, and upload it to twitter.")
+parser.add_argument("--profile", action="store_true", help="Profile the run to the profiles directory, also set by PROFILE_EVERY.")
 
-top_tracks = [track for track in top_tracks["items"]]
+# Profile the only cycle of the run, if profiling is enabled.
+profiler.every = 1 if parser.parse_args().profile or Config.PROFILE_EVERY else 0
 
-# Get song info with switch to recently played if no song is playing.
-song = get_song_info(spotify=spotify)
+configure_logging()
+clients = create_clients()
+spotify = clients.spotify
+twitter = clients.twitter
 
-# Get the status.
-status = random.choice(Config.STATUS_MAPPING[song.is_now_playing]) + ":"
+with profiler.cycle("update-banner"):
+    # Get top tracks.
+    top_tracks = spotify.top_tracks(limit=5)
 
-# Generate the spotify banner image.
-generate_image(status, song, top_tracks, Config.IMAGE_PATH)
+    top_tracks = [track for track in top_tracks["items"]]
 
-# Update the banner
-update_twitter_banner(twitter)
+    # Get song info with switch to recently played if no song is playing.
+    song = get_song_info(spotify=spotify)
+
+    # Get the status.
+    status = get_status(song)
+
+    # Generate the spotify banner image.
+    generate_image(status, song, top_tracks, Config.IMAGE_PATH)
+
+    # Update the banner
+    update_twitter_banner(twitter)
@@ -15,7 +15,8 @@ class Config:
     SCOPES = [
         "user-read-currently-playing",
         "user-read-recently-played",
-        "user-top-read"
+        "user-top-read",
+        "user-read-playback-state"
     ]
 
 